@@ -0,0 +1,123 @@
+import csv
+import os
+import threading
+import time
+
+import http_client
+from spatial_index import GridIndex
+
+AIRPORTS_CSV = os.getenv("AIRPORTS_CSV", "airports.csv")
+AIRPORTS_SOURCE_URL = os.getenv("AIRPORTS_SOURCE_URL", "https://davidmegginson.github.io/ourairports-data/airports.csv")
+REFRESH_INTERVAL = float(os.getenv("AIRPORTS_REFRESH_INTERVAL", 7 * 24 * 3600))  # seconds
+AIRPORT_TYPES = {"large_airport", "medium_airport"}
+LOAD_RETRY_INTERVAL = 300  # seconds to wait after a failed load before trying again
+
+_index = None
+_index_lock = threading.Lock()
+_load_lock = threading.Lock()
+_refresh_timer = None
+_last_failure = 0.0
+
+
+def load_airports(path=AIRPORTS_CSV):
+    """
+    Read an OurAirports-style CSV and keep airports with an IATA code
+    and scheduled passenger service.
+    """
+    airports = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            iata = (row.get("iata_code") or "").strip()
+            if not iata or row.get("type") not in AIRPORT_TYPES:
+                continue
+            if row.get("scheduled_service", "yes") != "yes":
+                continue
+            try:
+                lat, lon = float(row["latitude_deg"]), float(row["longitude_deg"])
+            except (KeyError, ValueError):
+                continue
+            airports.append({
+                "name": row.get("name") or iata,
+                "iataCode": iata,
+                "lat": lat,
+                "lon": lon,
+                "city": row.get("municipality", ""),
+                "country": row.get("iso_country", "")
+            })
+    return airports
+
+
+class AirportIndex:
+    def __init__(self, airports):
+        self.airports = airports
+        self.grid = GridIndex(((a["lat"], a["lon"], a) for a in airports), cell_deg=1.0)
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        return [dict(a, distance_km=round(d, 1)) for d, a in self.grid.nearest(lat, lon, k, max_km)]
+
+    def within_radius(self, lat, lon, radius_km):
+        return [dict(a, distance_km=round(d, 1)) for d, a in self.grid.within_radius(lat, lon, radius_km)]
+
+
+def download_airports(path=AIRPORTS_CSV, url=AIRPORTS_SOURCE_URL):
+    res = http_client.get(url)
+    res.raise_for_status()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(res.content)
+    os.replace(tmp_path, path)
+
+
+def _is_stale(path):
+    return not os.path.exists(path) or time.time() - os.path.getmtime(path) > REFRESH_INTERVAL
+
+
+def refresh():
+    """
+    Download a fresh dataset if the local copy is missing or stale, and swap in a new index.
+    """
+    global _index
+    if _is_stale(AIRPORTS_CSV):
+        download_airports()
+    index = AirportIndex(load_airports())
+    with _index_lock:
+        _index = index
+    return index
+
+
+def _scheduled_refresh():
+    try:
+        refresh()
+    except Exception:
+        pass  # keep serving the previous index
+    _schedule_refresh()
+
+
+def _schedule_refresh():
+    global _refresh_timer
+    _refresh_timer = threading.Timer(REFRESH_INTERVAL, _scheduled_refresh)
+    _refresh_timer.daemon = True
+    _refresh_timer.start()
+
+
+def get_index():
+    """
+    Return the shared AirportIndex, loading it on first use, or None when
+    no dataset is available (callers fall back to the Amadeus API).
+    """
+    global _last_failure
+    if _index is not None:
+        return _index
+    with _load_lock:
+        if _index is not None:
+            return _index
+        if time.time() - _last_failure < LOAD_RETRY_INTERVAL:
+            return None
+        try:
+            index = refresh()
+        except Exception:
+            _last_failure = time.time()
+            return None
+        if _refresh_timer is None:
+            _schedule_refresh()
+        return index
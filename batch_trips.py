@@ -0,0 +1,300 @@
+"""
+Headless batch trip planning, for reports over many trips without the UI.
+
+Reads trips from CSV or JSONL, one per row/line:
+
+    id, origin, destination[, mpg][, variants][, num_intervals]
+
+origin/destination are addresses (geocoded through OpenCage) or "lat,lon".
+variants is "tolls", "no_tolls" or both separated by ";" (default no_tolls).
+Each trip is geocoded and then planned by trip_pipeline.run_trip, like in
+the app (same trip cache and hot pairs, variants routed concurrently):
+routes costed with estimate_gas_cost, interval stops with their POIs,
+optionally weather, plus flights when asked for. Results are appended to a
+JSONL file as they finish, which doubles as the checkpoint: rerunning with
+the same --out skips trips already planned and retries the ones that
+failed, except rows marked "retry": false because their input can never
+be planned (the later line for an id supersedes earlier ones).
+
+    python batch_trips.py trips.csv --out results.jsonl --concurrency 8 [--weather] [--flights] [--parquet results.parquet]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import requests
+
+import geocoding
+from openrouteservice_api import ROUTE_VARIANTS
+from trip_pipeline import run_trip
+
+DEFAULT_MPG = 22
+DEFAULT_VARIANTS = ["no_tolls"]
+PROGRESS_EVERY = 50  # trips between progress lines
+QUERY_STRING = re.compile(r"(/[^\s?]*)\?[^\s)'\"]*")  # "?..." after a URL path, e.g. "/json?q=...&key=..."
+
+
+def read_trips(path):
+    """
+    Yield trip dicts from a .csv or .jsonl/.ndjson file; rows without an id
+    are numbered by position.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for i, row in enumerate(rows, 1):
+            row = {k: v for k, v in row.items() if v not in (None, "")}
+            row.setdefault("id", str(i))
+            row["id"] = str(row["id"])
+            yield row
+
+
+def completed_ids(out_path):
+    """
+    Ids finished by an earlier run, so a rerun resumes: planned successfully,
+    or failed with "retry": false. Other failed trips and lines cut short
+    by a crash are not counted, so they are redone.
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row.get("error") is None or row.get("retry") is False:
+                done.add(row["id"])
+    return done
+
+
+def resolve(place):
+    """
+    (lat, lon) for "lat,lon" text, a [lat, lon] list or an address.
+    """
+    if isinstance(place, (list, tuple)):
+        return float(place[0]), float(place[1])
+    lat, sep, lon = place.partition(",")
+    try:
+        if sep:
+            return float(lat), float(lon)
+    except ValueError:
+        pass
+    results = geocoding.suggest(place)
+    if not results:
+        raise ValueError(f"Could not geocode {place!r}")
+    return tuple(results[0]["value"])
+
+
+def _variants(trip):
+    variants = trip.get("variants", DEFAULT_VARIANTS)
+    if isinstance(variants, str):
+        variants = [v.strip() for v in variants.split(";") if v.strip()]
+    unknown = [v for v in variants if v not in ROUTE_VARIANTS]
+    if unknown or not variants:
+        raise ValueError(f"Unknown variants {unknown}; expected {sorted(ROUTE_VARIANTS)}")
+    return variants
+
+
+def _error_message(e):
+    """
+    A failure description safe to write out: HTTP errors are reduced to
+    status and host, and query strings (which carry API keys) are removed
+    from any URL in other messages.
+    """
+    name = type(e).__name__
+    if isinstance(e, requests.RequestException) and e.request is not None:
+        host = urlparse(e.request.url).netloc
+        status = getattr(e.response, "status_code", None)
+        return f"{name}: {status} from {host}" if status else f"{name}: {host}"
+    return f"{name}: " + QUERY_STRING.sub(r"\1", str(e))
+
+
+def plan_trip(trip, weather=False, flights=False):
+    """
+    Plan one trip through run_trip; returns the result row, with "error"
+    set instead of raising when a stage fails, and "retry": False as well
+    when the input itself is unusable (bad mpg or variants, a missing or
+    ungeocodable place). timings_ms has one entry per stage run: geocoding
+    and flights are timed directly, run_trip's stages by when their event
+    arrived after routing started, since they overlap.
+    """
+    timings = {}
+    started = time.perf_counter()
+    result = {"id": trip["id"], "origin": trip.get("origin"), "destination": trip.get("destination"), "error": None}
+
+    def timed(stage, func, *args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage] = round((time.perf_counter() - t) * 1000, 1)
+
+    try:
+        try:
+            mpg = float(trip.get("mpg", DEFAULT_MPG))
+            num_intervals = int(trip.get("num_intervals", 0))
+            variants = _variants(trip)
+            origin = timed("geocode_origin", resolve, trip["origin"])
+            dest = timed("geocode_destination", resolve, trip["destination"])
+        except requests.RequestException:
+            raise  # geocoder unreachable or erroring: worth retrying
+        except (KeyError, TypeError, ValueError):
+            result["retry"] = False
+            raise
+        result.update(origin_coords=list(origin), dest_coords=list(dest), mpg=mpg, routes={})
+
+        errors = []
+        routing_started = time.perf_counter()
+        for stage, key, payload in run_trip(origin, dest, variants, mpg, num_intervals, weather=weather):
+            elapsed = round((time.perf_counter() - routing_started) * 1000, 1)
+            if stage == "error":
+                errors.append(payload)
+            elif stage == "route":
+                timings[f"route_{key}"] = elapsed
+                result["routes"][key] = {
+                    "duration_mins": round(payload["duration_mins"], 2),
+                    "distance_miles": round(payload["distance_miles"], 2),
+                    "gas_cost": payload["gas_cost"],
+                }
+            else:
+                timings[stage] = elapsed
+                result[stage] = payload
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        if flights:
+            from flight_data import get_flights
+            offers, message = timed("flights", get_flights, origin, dest)
+            result["flights"] = offers or []
+            if message:
+                result["flights_message"] = message
+    except Exception as e:
+        result["error"] = _error_message(e)
+
+    result["timings_ms"] = timings
+    result["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def run_batch(trips, out_path, concurrency=8, weather=False, flights=False, progress=None):
+    """
+    Plan trips with at most `concurrency` in flight, appending each result
+    to out_path as soon as it is ready. Trips whose id is already in
+    out_path are skipped. Returns {"planned", "failed", "skipped", "seconds", "trips_per_sec"}.
+    """
+    done_ids = completed_ids(out_path)
+    counts = {"planned": 0, "failed": 0, "skipped": 0}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def write(result):
+            with lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                counts["planned"] += 1
+                counts["failed"] += result["error"] is not None
+                if progress and counts["planned"] % PROGRESS_EVERY == 0:
+                    progress(counts, time.perf_counter() - started)
+
+        pending = set()
+        for trip in trips:
+            if trip["id"] in done_ids:
+                counts["skipped"] += 1
+                continue
+            done_ids.add(trip["id"])  # also drops duplicate ids within the input
+            if len(pending) >= concurrency * 2:  # bounded read-ahead keeps memory flat on huge inputs
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+            pending.add(pool.submit(plan_trip, trip, weather, flights))
+        for future in wait(pending).done:
+            write(future.result())
+
+    seconds = time.perf_counter() - started
+    counts.update(seconds=round(seconds, 2), trips_per_sec=round(counts["planned"] / seconds, 2) if seconds else 0.0)
+    return counts
+
+
+def write_parquet(jsonl_path, parquet_path, batch_size=10000):
+    """
+    Convert the JSONL results (every run so far, latest line per id) to
+    Parquet. Nested fields are stored as JSON strings. Requires pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+
+    def flatten(row):
+        return {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in row.items()}
+
+    def rows():
+        with open(jsonl_path, encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                try:
+                    yield n, flatten(json.loads(line))
+                except ValueError:
+                    continue
+
+    # First pass fixes one schema for the whole file (resumed runs may add
+    # columns, e.g. --weather, and early batches may hold only nulls) and
+    # finds the latest line for each id
+    types, latest = {}, {}
+    for n, row in rows():
+        latest[row["id"]] = n
+        for key, value in row.items():
+            if types.get(key) is None:
+                types[key] = None if value is None else type(value)
+    arrow_types = {bool: pa.bool_(), int: pa.float64(), float: pa.float64()}
+    schema = pa.schema([(key, arrow_types.get(t, pa.string())) for key, t in types.items()])
+
+    with pq.ParquetWriter(parquet_path, schema) as writer:
+        batch = []
+        for n, row in rows():
+            if latest[row["id"]] != n:
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trips", help="input .csv or .jsonl")
+    parser.add_argument("--out", required=True, help="results .jsonl (appended to; also the resume checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--weather", action="store_true", help="add forecast temperatures along each route")
+    parser.add_argument("--flights", action="store_true", help="add Amadeus flight offers for each trip")
+    parser.add_argument("--parquet", help="also write all results to this Parquet file at the end")
+    args = parser.parse_args()
+
+    def progress(counts, seconds):
+        print(f"{counts['planned']} trips, {counts['planned'] / seconds:.2f} trips/s", file=sys.stderr)
+
+    summary = run_batch(read_trips(args.trips), args.out, args.concurrency, args.weather, args.flights, progress)
+    print(
+        f"{summary['trips_per_sec']:.2f} trips/s: {summary['planned']} planned ({summary['failed']} failed), "
+        f"{summary['skipped']} already done, in {summary['seconds']:.1f}s",
+        file=sys.stderr
+    )
+    if args.parquet:
+        write_parquet(args.out, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Offline benchmark for the routing and stop-planning path.
+
+Replays recorded ORS, Nominatim, Open-Meteo, OpenCage and Amadeus
+responses through a local stub server and reports wall time, CPU time
+and peak Python memory per operation and route.
+
+    python benchmarks/run.py                   # replay and compare with baseline.json
+    python benchmarks/run.py --update-baseline
+    python benchmarks/run.py record            # re-record from the live APIs, with real API keys in the environment
+    python benchmarks/run.py synthesize        # regenerate the shipped synthetic fixtures (see synthetic.py)
+
+Replay fails (exit status 1) on a regression, on an operation that errors
+(e.g. a request with no fixture) and when fixtures or baseline.json are
+missing. Timings are machine-specific: on new hardware, run
+--update-baseline once from a known-good commit first.
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import stub_server  # noqa: E402
+import synthetic  # noqa: E402
+
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+AIRPORTS_FIXTURE = os.path.join(HERE, "fixtures", "airports.csv")
+STUBBED_HOSTS = [
+    "nominatim.openstreetmap.org", "api.open-meteo.com", "api.opencagedata.com",
+    "test.api.amadeus.com", "overpass-api.de",
+]
+
+SCENARIOS = {
+    "short": {"origin": ("Times Square, New York", (40.7580, -73.9855)),
+              "destination": ("Downtown Brooklyn, New York", (40.6928, -73.9903))},
+    "metro": {"origin": ("Penn Station, New York", (40.7506, -73.9935)),
+              "destination": ("Stamford, Connecticut", (41.0534, -73.5387))},
+    "cross_country": {"origin": ("Manhattan, New York", (40.7831, -73.9712)),
+                      "destination": ("Los Angeles, California", (34.0522, -118.2437))},
+}
+NUM_STOPS = 5
+MIN_REGRESSION_S = 0.02  # slowdowns smaller than this are scheduling noise on the stubbed network calls
+
+
+def _configure(base_url):
+    """
+    Point every external API at the stub before the app modules are imported.
+    """
+    os.environ["ORS_BASE_URL"] = f"{base_url}/api.openrouteservice.org"
+    os.environ.setdefault("ORS_API_KEY", "fixture")
+    os.environ.setdefault("OPENCAGE_KEY", "fixture")
+    os.environ.setdefault("AMADEUS_KEY", "fixture")
+    os.environ.setdefault("AMADEUS_SECRET", "fixture")
+    os.environ["AIRPORTS_CSV"] = AIRPORTS_FIXTURE
+    os.environ["AIRPORTS_REFRESH_INTERVAL"] = "1e9"  # never re-download the fixture, however old its mtime
+    os.environ["ROUTE_CACHE_BYPASS"] = "1"
+    os.environ["ROUTER_AI_MODEL"] = "stub"
+    os.environ.setdefault("ROUTER_AI_STUB_DELAY", "0")
+    os.environ["RATE_LIMITS"] = ",".join(f"{host}=1000/1000" for host in STUBBED_HOSTS)
+    os.environ["HTTP_HOST_OVERRIDES"] = ",".join(f"{host}={base_url}/{host}" for host in STUBBED_HOSTS)
+
+
+def _reset_caches():
+    import airports
+    import geocoding
+    import route_geometry
+    import router_ai
+    import weather_agent
+    geocoding._cache.clear()
+    weather_agent._forecast_cache.clear()
+    route_geometry._from_polyline.cache_clear()
+    airports._index = None
+    router_ai._cache.clear()
+
+
+def _operations(scenario):
+    import flight_data
+    import geocoding
+    import openrouteservice_api as ors
+    import router_ai
+    import weather_agent
+
+    (origin_name, origin), (dest_name, dest) = scenario["origin"], scenario["destination"]
+    state = {}
+
+    def route():
+        state["route"] = ors.get_driving_route(origin, dest, avoid_tolls=True)
+
+    def intervals():
+        state["stops"] = ors.get_interval_coords(state["route"]["polyline"], NUM_STOPS)
+
+    def pois():
+        for lat, lon in state["stops"]:
+            ors.search_nearby_pois(lat, lon, "gas")
+
+    def weather():
+        coords = weather_agent.extract_route_coords(state["route"]["polyline"])
+        eta = weather_agent.estimate_arrival_times(coords, state["route"]["duration_mins"])
+        weather_agent.get_weather_for_coords(coords, eta)
+
+    def flights():
+        flight_data.get_flights(origin, dest)
+
+    return [
+        ("geocode", lambda: geocoding.suggest(origin_name)),
+        ("get_driving_route", route),
+        ("get_interval_coords", intervals),
+        ("search_nearby_pois", pois),
+        ("get_weather_for_coords", weather),
+        ("get_flights", flights),
+        ("ask_router_ai", lambda: router_ai.ask("Where should we stop to eat?", f"Origin: {origin}, Destination: {dest}")),
+    ]
+
+
+def _measure(func, repeats):
+    walls, cpus, peaks = [], [], []
+    for _ in range(repeats):
+        _reset_caches()
+        gc.collect()
+        tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        func()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "wall_s": round(statistics.median(walls), 6),
+        "wall_min_s": round(min(walls), 6),  # compared against the baseline: the least noisy of the timings
+        "cpu_s": round(statistics.median(cpus), 6),
+        "peak_kb": round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def run(repeats):
+    results = {}
+    for name, scenario in SCENARIOS.items():
+        for op, func in _operations(scenario):
+            try:
+                results[f"{name}/{op}"] = _measure(func, repeats)
+            except Exception as e:
+                results[f"{name}/{op}"] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def record():
+    """
+    Record fixtures by running every operation once against the live APIs.
+    """
+    if not os.path.exists(AIRPORTS_FIXTURE):
+        import airports
+        full_path = AIRPORTS_FIXTURE + ".full"
+        airports.download_airports(full_path, os.getenv("AIRPORTS_SOURCE_URL", airports.AIRPORTS_SOURCE_URL))
+        with open(full_path, newline="", encoding="utf-8") as src, open(AIRPORTS_FIXTURE, "w", newline="", encoding="utf-8") as dst:
+            reader = csv.DictReader(src)
+            writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+            writer.writeheader()
+            writer.writerows(r for r in reader if r.get("iata_code") and r.get("type") in airports.AIRPORT_TYPES)
+        os.remove(full_path)
+    return run(repeats=1)
+
+
+def synthesize():
+    """
+    Generate fixtures for every request the operations make, without network access.
+    """
+    if not os.path.exists(AIRPORTS_FIXTURE):
+        with open(AIRPORTS_FIXTURE, "w", encoding="utf-8") as f:
+            f.write(synthetic.AIRPORTS_CSV)
+    return run(repeats=1)
+
+
+def _fixture_count():
+    return sum(name.endswith(".json") for name in os.listdir(stub_server.FIXTURES_DIR))
+
+
+def compare(results, baseline, tolerance):
+    regressions = [f"{key}: {r['error']}" for key, r in results.items() if "error" in r and key not in baseline]
+    for key, base in baseline.items():
+        current = results.get(key)
+        if current is None or "error" in current:
+            regressions.append(f"{key}: {current['error'] if current else 'missing'}")
+            continue
+        for metric in ("wall_min_s", "peak_kb"):
+            slack = MIN_REGRESSION_S if metric == "wall_min_s" else 0
+            if base.get(metric) and current[metric] > max(base[metric] * (1 + tolerance), base[metric] + slack):
+                regressions.append(f"{key}: {metric} {current[metric]} > baseline {base[metric]} (+{tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", nargs="?", choices=["replay", "record", "synthesize"], default="replay")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.mode == "replay" and (not _fixture_count() or not os.path.exists(AIRPORTS_FIXTURE)):
+        print("No fixtures in benchmarks/fixtures; run 'record' or 'synthesize' first.")
+        return 1
+
+    server, base_url = stub_server.start(record=args.mode == "record", synthesize=args.mode == "synthesize")
+    _configure(base_url)
+    try:
+        results = {"record": record, "synthesize": synthesize}.get(args.mode, lambda: run(args.repeats))()
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'operation':45} {'wall ms':>10} {'cpu ms':>10} {'peak KB':>10}")
+        for key, r in results.items():
+            if "error" in r:
+                print(f"{key:45} ERROR {r['error']}")
+            else:
+                print(f"{key:45} {r['wall_s'] * 1000:10.2f} {r['cpu_s'] * 1000:10.2f} {r['peak_kb']:10.1f}")
+
+    if args.mode != "replay":
+        return 0
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({k: v for k, v in results.items() if "error" not in v}, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline yet; run with --update-baseline to create one.")
+        return 1
+    with open(BASELINE_PATH) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Startup benchmark for transportnyc.py.
+
+Measures, in a scratch directory with dummy secrets and no network use:
+  * cold import time of the app's modules, in a fresh interpreter;
+  * the first script run (wall time, including imports) and the median
+    rerun (script body only, from its tracing request span), through
+    Streamlit's AppTest.
+
+    python benchmarks/startup.py [--runs 5] [--reruns 20] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+APP_MODULES = [
+    "openrouteservice_api", "google_maps", "geocoding", "weather_agent", "flight_data", "trip_pipeline",
+    "poi_corridor", "router_ai", "hot_pairs", "worker_pool", "db", "chat_store",
+]
+DUMMY_SECRETS = ["LOCATIONIQ_KEY", "OPENAI_API_KEY", "GCP_API_KEY", "OPENCAGE_KEY", "AMADEUS_KEY", "AMADEUS_SECRET"]
+ENV = {"HOT_PAIRS_REFRESH_INTERVAL": "0", "ORS_API_KEY": "benchmark"}
+
+
+def _dummy(name):
+    return "AIza-benchmark" if name == "GCP_API_KEY" else "benchmark"  # googlemaps checks the key prefix
+
+
+def _scratch_dir():
+    path = tempfile.mkdtemp(prefix="transportnyc-startup-")
+    os.makedirs(os.path.join(path, ".streamlit"))
+    with open(os.path.join(path, ".streamlit", "secrets.toml"), "w") as f:
+        f.writelines(f'{name} = "{_dummy(name)}"\n' for name in DUMMY_SECRETS)
+    shutil.copy(os.path.join(REPO, "router-logo.png"), path)
+    return path
+
+
+def cold_import_seconds(cwd):
+    code = (
+        "import time; t = time.perf_counter()\n"
+        f"for m in {APP_MODULES!r}: __import__(m)\n"
+        "print(time.perf_counter() - t)"
+    )
+    env = dict(os.environ, PYTHONPATH=REPO, **ENV)
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(out.stderr)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def script_run_seconds(cwd, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.update(ENV)
+    os.chdir(cwd)
+    sys.path.insert(0, REPO)
+    at = AppTest.from_file(os.path.join(REPO, "transportnyc.py"), default_timeout=60)
+    for name in DUMMY_SECRETS:
+        at.secrets[name] = _dummy(name)
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    import tracing  # the module the script itself imports; its request traces time the script body alone
+    times = []
+    for _ in range(reruns):
+        at.run()
+        times.append(tracing.recent_requests()[-1]["duration"])
+    return first, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters for the cold import")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    cwd = _scratch_dir()
+    try:
+        imports = [cold_import_seconds(cwd) for _ in range(args.runs)]
+        first, rerun = script_run_seconds(cwd, args.reruns)
+    finally:
+        os.chdir(REPO)
+        shutil.rmtree(cwd, ignore_errors=True)
+
+    results = {
+        "cold_import_ms": round(statistics.median(imports) * 1000, 1),
+        "first_run_ms": round(first * 1000, 1),
+        "rerun_ms": round(rerun * 1000, 1),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, value in results.items():
+            print(f"{name:16} {value:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Local stand-in for the external APIs, replaying recorded responses.
+
+Requests arrive as /<upstream host>/<path>?<query> (see
+http_client.override_host and ORS_BASE_URL). In replay mode the matching
+fixture is served, or a 404 naming the missing fixture. In record mode
+the request is forwarded to https://<upstream host>/<path> and the
+response is saved as a fixture first; in synthesize mode a generated
+response from synthetic.py is saved instead.
+"""
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+import synthetic
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Credentials and values that change day to day are left out of fixture keys
+IGNORED_FIELDS = {"key", "client_id", "client_secret", "departureDate"}
+HOP_BY_HOP_HEADERS = {"host", "content-length", "connection", "accept-encoding"}
+
+
+def _normalize(pairs):
+    return sorted((k, v) for k, v in pairs if k not in IGNORED_FIELDS)
+
+
+def fixture_key(method, host, path, query, body, content_type):
+    if "json" in (content_type or ""):
+        try:
+            body = json.dumps(json.loads(body or b"{}"), sort_keys=True)
+        except ValueError:
+            body = (body or b"").decode("utf-8", "replace")
+    elif "x-www-form-urlencoded" in (content_type or ""):
+        body = urlencode(_normalize(parse_qsl((body or b"").decode())))
+    else:
+        body = (body or b"").decode("utf-8", "replace")
+    raw = json.dumps([method, host, path, urlencode(_normalize(parse_qsl(query))), body])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _redact(body_text):
+    try:
+        data = json.loads(body_text)
+    except ValueError:
+        return body_text
+    if isinstance(data, dict) and "access_token" in data:
+        data["access_token"] = "fixture-token"
+        return json.dumps(data)
+    return body_text
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes; don't let them wait on delayed ACKs
+    record = False
+    synthesize = False
+    fixtures_dir = FIXTURES_DIR
+
+    def _handle(self):
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        key = fixture_key(self.command, host, path, parts.query, body, self.headers.get("Content-Type"))
+        fixture_path = os.path.join(self.fixtures_dir, f"{key}.json")
+
+        fetched = None
+        if self.record and not os.path.exists(fixture_path):
+            headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+            upstream = requests.request(self.command, f"https://{host}{path}", params=parts.query or None,
+                                        data=body or None, headers=headers, timeout=60)
+            fetched = upstream.status_code, upstream.headers.get("Content-Type", "application/json"), _redact(upstream.text)
+        elif self.synthesize and not os.path.exists(fixture_path):
+            fetched = synthetic.response(self.command, host, path, parts.query, body)
+        if fetched is not None:
+            status, content_type, text = fetched
+            with open(fixture_path, "w") as f:
+                json.dump({
+                    "request": {"method": self.command, "host": host, "path": path},
+                    "status": status,
+                    "content_type": content_type,
+                    "body": text
+                }, f)
+
+        if not os.path.exists(fixture_path):
+            self._send(404, "application/json", json.dumps({"error": f"no fixture {key} for {self.command} {host}{path}"}))
+            return
+        with open(fixture_path) as f:
+            fixture = json.load(f)
+        self._send(fixture["status"], fixture["content_type"], fixture["body"])
+
+    def _send(self, status, content_type, text):
+        payload = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+def start(record=False, fixtures_dir=FIXTURES_DIR, port=0, synthesize=False):
+    """
+    Start the stub on a background thread; returns (server, base_url).
+    """
+    os.makedirs(fixtures_dir, exist_ok=True)
+    handler = type("Handler", (StubHandler,), {"record": record, "synthesize": synthesize, "fixtures_dir": fixtures_dir})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
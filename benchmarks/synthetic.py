@@ -0,0 +1,146 @@
+"""
+Synthetic stand-ins for the external API responses, used to build the
+fixture set shipped with the benchmarks (python benchmarks/run.py
+synthesize), so replay works without API keys.
+
+Responses have the real ones' shape and roughly their size (a route
+vertex every ROUTE_VERTEX_SPACING_M, an hourly forecast for every
+requested point), and are deterministic: the same request always gets
+the same body.
+"""
+import hashlib
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl
+
+import polyline as pl
+
+ROUTE_VERTEX_SPACING_M = 400
+ROUTE_SPEED_MPS = 20.0  # ~45 mph average
+FORECAST_START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+FORECAST_HOURS = 24  # real responses carry a week; one day keeps the shipped fixtures small
+AIRPORTS_CSV = """\
+iata_code,type,scheduled_service,latitude_deg,longitude_deg,name,municipality,iso_country
+JFK,large_airport,yes,40.6398,-73.7789,John F Kennedy International Airport,New York,US
+LGA,large_airport,yes,40.7772,-73.8726,LaGuardia Airport,New York,US
+EWR,large_airport,yes,40.6925,-74.1687,Newark Liberty International Airport,Newark,US
+HPN,medium_airport,yes,41.0670,-73.7076,Westchester County Airport,White Plains,US
+ISP,medium_airport,yes,40.7952,-73.1002,Long Island MacArthur Airport,Islip,US
+BDL,large_airport,yes,41.9389,-72.6832,Bradley International Airport,Windsor Locks,US
+LAX,large_airport,yes,33.9425,-118.4081,Los Angeles International Airport,Los Angeles,US
+BUR,medium_airport,yes,34.2007,-118.3590,Hollywood Burbank Airport,Burbank,US
+LGB,medium_airport,yes,33.8177,-118.1516,Long Beach Airport,Long Beach,US
+ONT,large_airport,yes,34.0560,-117.6012,Ontario International Airport,Ontario,US
+"""
+
+
+def _rng(*parts):
+    return random.Random(hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).digest())
+
+
+def _distance_m(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371e3 * 2 * math.asin(math.sqrt(h))
+
+
+def _route(start, end, rng):
+    # A gently curving, slightly noisy line between the endpoints
+    n = max(2, int(_distance_m(start, end) / ROUTE_VERTEX_SPACING_M))
+    phase, amplitude = rng.uniform(0, math.pi), rng.uniform(0.02, 0.08)
+    points = []
+    for i in range(n + 1):
+        t = i / n
+        bend = amplitude * math.sin(math.pi * t + phase) * math.sin(math.pi * t)
+        points.append((
+            round(start[0] + (end[0] - start[0]) * t + bend + rng.gauss(0, 0.0005), 5),
+            round(start[1] + (end[1] - start[1]) * t - bend + rng.gauss(0, 0.0005), 5),
+        ))
+    points[0], points[-1] = tuple(start), tuple(end)
+    distance = sum(_distance_m(a, b) for a, b in zip(points, points[1:]))
+    roads = ["I-95", "I-87", "US-1", "Route 9", "Hutchinson River Parkway", "I-80", "I-70", "Garden State Parkway"]
+    steps = [
+        {"instruction": f"Continue onto {rng.choice(roads)}", "distance": distance / 8, "duration": distance / 8 / ROUTE_SPEED_MPS}
+        for _ in range(8)
+    ]
+    return {
+        "summary": {"distance": distance, "duration": distance / ROUTE_SPEED_MPS},
+        "segments": [{"distance": distance, "duration": distance / ROUTE_SPEED_MPS, "steps": steps}],
+        "geometry": pl.encode(points),
+    }
+
+
+def _directions(body):
+    request = json.loads(body or b"{}")
+    (lon1, lat1), (lon2, lat2) = request["coordinates"]
+    rng = _rng("ors", request)
+    count = request.get("alternative_routes", {}).get("target_count", 1)
+    return {"routes": [_route((lat1, lon1), (lat2, lon2), rng) for _ in range(count)]}
+
+
+def _geocode(params):
+    rng = _rng("opencage", params.get("q"))
+    lat, lon = 40.7 + rng.uniform(-0.2, 0.2), -73.9 + rng.uniform(-0.2, 0.2)
+    return {"results": [
+        {"formatted": f"{params.get('q')} {i + 1}", "geometry": {"lat": lat + i * 0.01, "lng": lon - i * 0.01}}
+        for i in range(int(params.get("limit", 5)))
+    ]}
+
+
+def _nominatim(params):
+    west, south, east, north = map(float, params["viewbox"].split(","))
+    rng = _rng("nominatim", params)
+    return [
+        {"display_name": f"{params['q'].title()} {i + 1}", "lat": str(rng.uniform(south, north)), "lon": str(rng.uniform(west, east))}
+        for i in range(int(params.get("limit", 3)))
+    ]
+
+
+def _forecast(params):
+    times = [(FORECAST_START + timedelta(hours=h)).strftime("%Y-%m-%dT%H:00") for h in range(FORECAST_HOURS)]
+    out = []
+    for lat, lon in zip(params["latitude"].split(","), params["longitude"].split(",")):
+        base = 25 - abs(float(lat) - 25) * 0.4
+        out.append({
+            "latitude": float(lat), "longitude": float(lon),
+            "hourly": {"time": times, "temperature_2m": [round(base + 6 * math.sin(h / 24 * 2 * math.pi), 1) for h in range(FORECAST_HOURS)]},
+        })
+    return out[0] if len(out) == 1 else out
+
+
+def _flight_offers(params):
+    rng = _rng("amadeus", params["originLocationCode"], params["destinationLocationCode"])
+    offers = []
+    for i in range(int(params.get("max", 3))):
+        hours, minutes = rng.randint(1, 6), rng.choice([0, 15, 30, 45])
+        offers.append({
+            "validatingAirlineCodes": [rng.choice(["AA", "B6", "DL", "UA"])],
+            "price": {"total": f"{rng.uniform(89, 499):.2f}"},
+            "itineraries": [{"duration": f"PT{hours}H{minutes}M"}],
+        })
+    return {"data": offers}
+
+
+def response(method, host, path, query, body):
+    """
+    (status, content_type, body text) for a request to host/path, or None
+    when there is no synthetic version of that endpoint.
+    """
+    params = dict(parse_qsl(query))
+    if host == "api.openrouteservice.org" and path.startswith("/v2/directions/"):
+        data = _directions(body)
+    elif host == "api.opencagedata.com":
+        data = _geocode(params)
+    elif host == "nominatim.openstreetmap.org":
+        data = _nominatim(params)
+    elif host == "api.open-meteo.com":
+        data = _forecast(params)
+    elif host == "test.api.amadeus.com" and path == "/v1/security/oauth2/token":
+        data = {"access_token": "fixture-token", "expires_in": 1799}
+    elif host == "test.api.amadeus.com" and path == "/v2/shopping/flight-offers":
+        data = _flight_offers(params)
+    else:
+        return None
+    return 200, "application/json", json.dumps(data, separators=(",", ":"))
@@ -0,0 +1,75 @@
+import json
+import os
+from datetime import datetime
+
+from db import get_connection as _conn
+
+LEGACY_CHAT_FILE = "chat.json"
+
+COLUMNS = ("id", "timestamp", "sender", "recipient", "message")
+
+
+def init_chat_store():
+    conn = _conn()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            recipient TEXT,
+            message TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_recipient ON chat_messages (recipient, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sender ON chat_messages (sender, id)")
+    conn.commit()
+    _migrate_legacy_json(conn)
+
+
+def _migrate_legacy_json(conn):
+    """
+    One-time import of the old chat.json history into an empty table.
+    """
+    if not os.path.exists(LEGACY_CHAT_FILE):
+        return
+    if conn.execute("SELECT 1 FROM chat_messages LIMIT 1").fetchone():
+        return
+    with open(LEGACY_CHAT_FILE, "r") as f:
+        entries = json.load(f)
+    rows = [
+        (c.get("timestamp") or "", c["sender"], c.get("recipient"), c["message"])
+        for c in entries
+        if c.get("message") and c.get("sender")
+    ]
+    conn.executemany("INSERT INTO chat_messages (timestamp, sender, recipient, message) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+
+
+def append_message(sender, message, recipient=None, timestamp=None):
+    conn = _conn()
+    cur = conn.execute(
+        "INSERT INTO chat_messages (timestamp, sender, recipient, message) VALUES (?, ?, ?, ?)",
+        (timestamp or datetime.now().isoformat(), sender, recipient, message)
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def recent_visible(username, limit=20, before_id=None):
+    """
+    Return the newest messages username can see (global, sent by them, or
+    private to them), newest first. Pass the smallest id of a page as
+    before_id to fetch the next older page.
+    """
+    before_id = before_id if before_id is not None else 2 ** 63 - 1
+    # One indexed range scan per visibility case, merged and trimmed in SQL
+    rows = _conn().execute("""
+        SELECT id, timestamp, sender, recipient, message FROM (
+            SELECT * FROM (SELECT * FROM chat_messages WHERE recipient IS NULL AND id < ? ORDER BY id DESC LIMIT ?)
+            UNION
+            SELECT * FROM (SELECT * FROM chat_messages WHERE recipient = ? AND id < ? ORDER BY id DESC LIMIT ?)
+            UNION
+            SELECT * FROM (SELECT * FROM chat_messages WHERE sender = ? AND id < ? ORDER BY id DESC LIMIT ?)
+        ) ORDER BY id DESC LIMIT ?
+    """, (before_id, limit, username, before_id, limit, username, before_id, limit, limit)).fetchall()
+    return [dict(zip(COLUMNS, r)) for r in rows]
@@ -1,9 +1,36 @@
+import atexit
 import sqlite3
+import threading
+
+DB_PATH = "app_data.db"
+COUNTER_COLUMNS = ("chat_count", "ai_count")
+FLUSH_THRESHOLD = 20  # pending increments before a synchronous flush
+FLUSH_INTERVAL = 5.0  # seconds between background flushes
+
+_local = threading.local()
+# Guards the pending increments and the user cache together, and is held
+# across a flush so readers never see a count both flushed and pending.
+_lock = threading.RLock()
+_pending = {}  # (username, column) -> unflushed increments
+_user_cache = {}
+_flush_timer = None
+
+
+def get_connection():
+    """
+    Return this thread's connection to app_data.db, opening it in WAL mode on first use.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=5, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
 
 def init_db():
-    conn = sqlite3.connect("app_data.db")
-    c = conn.cursor()
-    c.execute("""
+    conn = get_connection()
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
             username TEXT PRIMARY KEY,
             password TEXT NOT NULL,
@@ -12,26 +39,71 @@ def init_db():
         )
     """)
     conn.commit()
-    conn.close()
 
 def create_user(username, hashed_pw):
-    conn = sqlite3.connect("app_data.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_pw))
+    conn = get_connection()
+    conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_pw))
     conn.commit()
-    conn.close()
+    with _lock:
+        _user_cache.pop(username, None)
 
 def get_user(username):
-    conn = sqlite3.connect("app_data.db")
-    c = conn.cursor()
-    c.execute("SELECT username, password, chat_count, ai_count FROM users WHERE username = ?", (username,))
-    user = c.fetchone()
-    conn.close()
-    return user
+    with _lock:
+        if username in _user_cache:
+            user = _user_cache[username]
+        else:
+            user = get_connection().execute(
+                "SELECT username, password, chat_count, ai_count FROM users WHERE username = ?", (username,)
+            ).fetchone()
+            if user is None:
+                return None  # not cached: the account may be created by another process
+            _user_cache[username] = user
+        # Fold in increments that are still buffered so counts read as up to date
+        chat = _pending.get((username, "chat_count"), 0)
+        ai = _pending.get((username, "ai_count"), 0)
+    return (user[0], user[1], user[2] + chat, user[3] + ai)
 
 def increment_count(username, column):
-    conn = sqlite3.connect("app_data.db")
-    c = conn.cursor()
-    c.execute(f"UPDATE users SET {column} = {column} + 1 WHERE username = ?", (username,))
-    conn.commit()
-    conn.close()
+    if column not in COUNTER_COLUMNS:
+        raise ValueError(f"Unknown counter column: {column}")
+    with _lock:
+        _pending[(username, column)] = _pending.get((username, column), 0) + 1
+        total = sum(_pending.values())
+    if total >= FLUSH_THRESHOLD:
+        flush_counts()
+    else:
+        _schedule_flush()
+
+def flush_counts():
+    """
+    Write all buffered counter increments in one transaction.
+    """
+    with _lock:
+        if not _pending:
+            return
+        conn = get_connection()
+        with conn:
+            for column in COUNTER_COLUMNS:
+                rows = [(n, username) for (username, col), n in _pending.items() if col == column]
+                if rows:
+                    conn.executemany(f"UPDATE users SET {column} = {column} + ? WHERE username = ?", rows)
+        for username, _ in _pending:
+            _user_cache.pop(username, None)
+        _pending.clear()
+
+def _timed_flush():
+    global _flush_timer
+    with _lock:
+        _flush_timer = None
+    flush_counts()
+
+def _schedule_flush():
+    global _flush_timer
+    with _lock:
+        if _flush_timer is not None:
+            return
+        _flush_timer = threading.Timer(FLUSH_INTERVAL, _timed_flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+atexit.register(flush_counts)
@@ -1,42 +1,150 @@
-import requests
+import os
+import http_client
+import airports
+import tracing
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import product
 from datetime import datetime, timedelta
 import streamlit as st
 
-AMADEUS_API_KEY = st.secrets["AMADEUS_KEY"]
-AMADEUS_API_SECRET = st.secrets["AMADEUS_SECRET"]
+AMADEUS_BASE_URL = "https://test.api.amadeus.com"
+TOKEN_REFRESH_MARGIN = 120  # seconds before expiry to fetch a new token
+BACKGROUND_REFRESH_LEAD = 60  # seconds the background refresh runs ahead of the margin, so callers never wait on it
+TOKEN_IDLE_TIMEOUT = 30 * 60  # seconds without get_token() calls after which background refreshes stop
+FLIGHT_SEARCH_DEADLINE = 15  # seconds; partial results are returned after this
+CANDIDATE_AIRPORTS = 3  # nearest airports tried at each end, e.g. JFK/LGA/EWR
+CANDIDATE_RADIUS_KM = 100
+
+
+def _secret(name):
+    # Environment first so headless runs (benchmarks, batch jobs) need no secrets.toml
+    return os.getenv(name) or st.secrets[name]
+
+
+class AmadeusTokenManager:
+    """
+    Thread-safe cache for the Amadeus OAuth token.
+    While the token is in use it is refreshed in the background a little
+    before callers would consider it stale; after idle_timeout without
+    callers the background refresh stops and the next caller fetches a new
+    one. Concurrent callers that find it missing or stale share a single refresh.
+    """
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN, idle_timeout=TOKEN_IDLE_TIMEOUT):
+        self.refresh_margin = refresh_margin
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._last_used = time.monotonic()
+        self._timer = None
+        self.auth_failed = False  # last token request was rejected, e.g. bad credentials
+
+    def _is_fresh(self):
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    def get_token(self):
+        self._last_used = time.monotonic()
+        if self._is_fresh():
+            return self._token
+        with self._lock:
+            if not self._is_fresh():
+                self._refresh_locked()
+            return self._token
+
+    def invalidate(self, token):
+        """
+        Drop token if it is still the cached one, e.g. after a 401.
+        Callers holding an older token do not discard a newer refresh.
+        """
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def _refresh_locked(self):
+        res = http_client.post(
+            f"{AMADEUS_BASE_URL}/v1/security/oauth2/token",
+            data={
+                "grant_type": "client_credentials",
+                "client_id": _secret("AMADEUS_KEY"),
+                "client_secret": _secret("AMADEUS_SECRET")
+            }
+        )
+        self.auth_failed = res.status_code != 200
+        if res.status_code != 200:
+            # Keep a token that has not actually expired yet; only the refresh margin was missed
+            if time.monotonic() >= self._expires_at:
+                self._token = None
+            return
+        data = res.json()
+        expires_in = float(data.get("expires_in", 1799))
+        self._token = data["access_token"]
+        self._expires_at = time.monotonic() + expires_in
+        self._schedule_refresh(max(1.0, expires_in - self.refresh_margin - BACKGROUND_REFRESH_LEAD))
+
+    def _schedule_refresh(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        if time.monotonic() - self._last_used > self.idle_timeout:
+            return  # idle: stop re-arming; the next get_token() refreshes in the foreground
+        with self._lock:
+            try:
+                self._refresh_locked()
+            except Exception:
+                # Leave the current token in place; the next caller retries once it goes stale
+                pass
+
+
+token_manager = AmadeusTokenManager()
+
 
 def get_amadeus_token():
-    res = requests.post(
-        "https://test.api.amadeus.com/v1/security/oauth2/token",
-        data={
-            "grant_type": "client_credentials",
-            "client_id": AMADEUS_API_KEY,
-            "client_secret": AMADEUS_API_SECRET
-        }
-    )
-    if res.status_code == 200:
-        return res.json()["access_token"]
-    return None
+    return token_manager.get_token()
+
+
+def amadeus_get(path, params):
+    """
+    GET an Amadeus endpoint with the cached token, refreshing and retrying once on 401.
+    Returns None when no token could be obtained.
+    """
+    for attempt in range(2):
+        token = token_manager.get_token()
+        if not token:
+            return None
+        res = http_client.get(f"{AMADEUS_BASE_URL}{path}", params=params, headers={"Authorization": f"Bearer {token}"})
+        if res.status_code != 401:
+            break
+        token_manager.invalidate(token)
+    return res
 
 def get_airports_by_coords(lat, lon, radius_km=100, max_results=10):
     """
     Returns a list of airports (dicts with name, iataCode, etc) near the provided coordinates.
+    Answered from the local airport index when available, otherwise from Amadeus.
     """
-    token = get_amadeus_token()
-    if not token:
-        return []
-    res = requests.get(
-        "https://test.api.amadeus.com/v1/reference-data/locations",
+    index = airports.get_index()
+    if index is not None:
+        return index.within_radius(lat, lon, radius_km)[:max_results]
+    res = amadeus_get(
+        "/v1/reference-data/locations",
         params={
             "latitude": lat,
             "longitude": lon,
             "radius": radius_km,  # in kilometers
             "subType": "AIRPORT",
             "page[limit]": max_results
-        },
-        headers={"Authorization": f"Bearer {token}"}
+        }
     )
-    if res.status_code == 200 and "data" in res.json():
+    if res is not None and res.status_code == 200 and "data" in res.json():
         return [
             {
                 "name": entry.get("name", entry.get("detailedName", entry["iataCode"])),
@@ -46,62 +154,110 @@ def get_airports_by_coords(lat, lon, radius_km=100, max_results=10):
         ]
     return []
 
-def get_nearest_airport_by_coords(lat, lon, token):
-    res = requests.get("https://test.api.amadeus.com/v1/reference-data/locations", params={
+def get_nearest_airport_by_coords(lat, lon):
+    index = airports.get_index()
+    if index is not None:
+        nearest = index.nearest(lat, lon, k=1, max_km=50)
+        return nearest[0]["iataCode"] if nearest else None
+
+    res = amadeus_get("/v1/reference-data/locations", params={
         "latitude": lat,
         "longitude": lon,
         "radius": 50,  # kilometers radius for NEAREST
         "subType": "AIRPORT",
         "page[limit]": 3
-    }, headers={"Authorization": f"Bearer {token}"})
+    })
 
-    if res.status_code == 200 and res.json().get("data"):
+    if res is not None and res.status_code == 200 and res.json().get("data"):
         return res.json()["data"][0]["iataCode"]
     return None
 
-def get_flights(from_coords, to_coords):
-    token = get_amadeus_token()
-    if not token:
-        return None, "Auth failed"
+def parse_duration_mins(iso_duration):
+    match = re.fullmatch(r"PT(?:(\d+)H)?(?:(\d+)M)?", iso_duration or "")
+    if not match:
+        return None
+    return int(match.group(1) or 0) * 60 + int(match.group(2) or 0)
 
-    from_iata = get_nearest_airport_by_coords(from_coords[0], from_coords[1], token)
-    to_iata = get_nearest_airport_by_coords(to_coords[0], to_coords[1], token)
-
-    if not from_iata or not to_iata:
-        return None, "Could not find airports"
-
-    departure_date = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
-
-    res = requests.get(
-        "https://test.api.amadeus.com/v2/shopping/flight-offers",
+@tracing.traced("amadeus.search_flight_offers")
+def search_flight_offers(from_iata, to_iata, departure_date, max_offers=3):
+    res = amadeus_get(
+        "/v2/shopping/flight-offers",
         params={
             "originLocationCode": from_iata,
             "destinationLocationCode": to_iata,
             "departureDate": departure_date,
             "adults": 1,
-            "max": 3,
+            "max": max_offers,
             "currencyCode": "USD"
-        },
-        headers={"Authorization": f"Bearer {token}"}
+        }
     )
 
-    if res.status_code != 200 or "data" not in res.json():
-        return None, f"No flights found from {from_iata} to {to_iata}"
+    if res is None or res.status_code != 200 or "data" not in res.json():
+        return []
 
     flights = []
     for flight in res.json()["data"]:
-        price = flight["price"]["total"]
-        duration = flight["itineraries"][0]["duration"].replace("PT", "").lower()
-        airline = flight["validatingAirlineCodes"][0]
+        iso_duration = flight["itineraries"][0]["duration"]
         flights.append({
             "from": from_iata,
             "to": to_iata,
-            "airline": airline,
-            "price": price,
-            "duration": duration
+            "airline": flight["validatingAirlineCodes"][0],
+            "price": flight["price"]["total"],
+            "duration": iso_duration.replace("PT", "").lower(),
+            "duration_mins": parse_duration_mins(iso_duration)
         })
+    return flights
+
+def rank_flights(flights):
+    """
+    Drop duplicate offers and sort by price, then duration.
+    """
+    unique = {}
+    for f in flights:
+        unique.setdefault((f["from"], f["to"], f["airline"], f["price"], f["duration"]), f)
+    return sorted(unique.values(), key=lambda f: (float(f["price"]), f["duration_mins"] or float("inf")))
+
+@tracing.traced("amadeus.get_flights")
+def get_flights(from_coords, to_coords, max_airports=CANDIDATE_AIRPORTS, deadline=FLIGHT_SEARCH_DEADLINE):
+    """
+    Resolve candidate airports at both ends concurrently, search every
+    origin/destination pair in parallel and return the merged, ranked offers.
+    Pairs still pending when the deadline passes are dropped.
+    """
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=max(2, max_airports * max_airports))
+    try:
+        from_future = pool.submit(tracing.propagate(get_airports_by_coords), from_coords[0], from_coords[1], CANDIDATE_RADIUS_KM, max_airports)
+        to_future = pool.submit(tracing.propagate(get_airports_by_coords), to_coords[0], to_coords[1], CANDIDATE_RADIUS_KM, max_airports)
+        wait([from_future, to_future], timeout=deadline)
+        if not (from_future.done() and to_future.done()):
+            return None, "Airport lookup timed out"
+        try:
+            from_codes = [a["iataCode"] for a in from_future.result()]
+            to_codes = [a["iataCode"] for a in to_future.result()]
+        except Exception as e:
+            return None, f"Airport lookup failed: {type(e).__name__}"
+
+        pairs = [(o, d) for o, d in product(from_codes, to_codes) if o != d]
+        if not pairs:
+            # The lookups above already asked for a token if they needed one
+            return None, "Auth failed" if token_manager.auth_failed else "Could not find airports"
+
+        departure_date = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
+        search = tracing.propagate(search_flight_offers)
+        futures = [pool.submit(search, o, d, departure_date) for o, d in pairs]
+        done, _ = wait(futures, timeout=max(0.0, deadline - (time.monotonic() - started)))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    flights = []
+    for future in done:
+        if future.exception() is None:
+            flights.extend(future.result())
 
-    return flights, None
+    if not flights:
+        return None, f"No flights found from {'/'.join(from_codes)} to {'/'.join(to_codes)}"
+    return rank_flights(flights), None
 
 # For easy import
 __all__ = ["get_flights", "get_airports_by_coords"]
@@ -0,0 +1,119 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+import http_client
+import tracing
+
+OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+CACHE_TTL = 24 * 3600  # seconds
+CACHE_MAX_ENTRIES = 2048
+MIN_PREFIX_LEN = 3
+RESULT_LIMIT = 5
+
+_cache = OrderedDict()  # normalized query -> (fetched_at, results); shared by every session
+_cache_lock = threading.Lock()
+stats = {"hits": 0, "prefix_hits": 0, "misses": 0}
+
+
+def normalize(query):
+    return " ".join(re.sub(r"[^\w]+", " ", query.lower()).split())
+
+
+def _api_key():
+    return os.getenv("OPENCAGE_KEY") or st.secrets["OPENCAGE_KEY"]
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > CACHE_TTL:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_put(key, results):
+    with _cache_lock:
+        _cache[key] = (time.time(), results)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _matches(label, tokens):
+    words = normalize(label).split()
+    return all(any(w.startswith(t) for w in words) for t in tokens)
+
+
+def _from_prefix(key):
+    """
+    Reuse results cached for a shorter prefix of key ("times" for "times sq")
+    when some of them still match every token of the longer query. Only
+    prefixes that returned fewer than RESULT_LIMIT results count: a full
+    list may have cut off better matches for the longer query.
+    """
+    tokens = key.split()
+    for end in range(len(key) - 1, MIN_PREFIX_LEN - 1, -1):
+        cached = _cache_get(key[:end].rstrip())
+        if cached and len(cached) < RESULT_LIMIT:
+            matching = [r for r in cached if _matches(r["label"], tokens)]
+            if matching:
+                return matching
+    return None
+
+
+def _fetch(query):
+    res = http_client.get(OPENCAGE_URL, params={
+        "q": query,
+        "key": _api_key(),
+        "limit": RESULT_LIMIT,
+        "no_annotations": 1
+    })
+    res.raise_for_status()
+    results = res.json().get("results", [])
+    return [{"label": i["formatted"], "value": (i["geometry"]["lat"], i["geometry"]["lng"])} for i in results]
+
+
+def suggest(query):
+    """
+    Return up to RESULT_LIMIT {"label", "value": (lat, lon)} suggestions for query.
+    """
+    key = normalize(query)
+    if not key:
+        return []
+    results = _cache_get(key)
+    if results is not None:
+        stats["hits"] += 1
+        return results
+    results = _from_prefix(key)
+    if results is not None:
+        stats["prefix_hits"] += 1
+    else:
+        stats["misses"] += 1
+        results = _fetch(query)
+    _cache_put(key, results)
+    return results
+
+
+def suggest_many(queries):
+    """
+    Run suggest() for several queries concurrently. Results come back in
+    order; a failed lookup yields its exception in place of the list.
+    """
+    def run(query):
+        try:
+            return suggest(query)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, len(queries))) as pool:
+        return list(pool.map(tracing.propagate(run), queries))
@@ -1,10 +1,37 @@
 import googlemaps
+import os
+import threading
 import streamlit as st
+import route_cache
 
-gmaps = googlemaps.Client(key=st.secrets["GCP_API_KEY"])
+LIVE_TRAFFIC_TTL = 5 * 60  # seconds; traffic-aware durations go stale quickly
+
+_gmaps = None
+_gmaps_lock = threading.Lock()
+
+def get_client():
+    """
+    The shared googlemaps client, created on first use; reading st.secrets
+    at import time made every importer pay for it.
+    """
+    global _gmaps
+    if _gmaps is None:
+        with _gmaps_lock:
+            if _gmaps is None:
+                _gmaps = googlemaps.Client(key=os.getenv("GCP_API_KEY") or st.secrets["GCP_API_KEY"])
+    return _gmaps
 
 def get_driving_route(origin_str, destination_str, avoid_tolls=False, use_live_traffic=True):
-    directions = gmaps.directions(
+    key = route_cache.make_key("google", origin_str, destination_str, avoid_tolls=avoid_tolls, live_traffic=use_live_traffic)
+    ttl = LIVE_TRAFFIC_TTL if use_live_traffic else None
+    return route_cache.get_or_compute(
+        key,
+        lambda: _fetch_driving_route(origin_str, destination_str, avoid_tolls, use_live_traffic),
+        ttl=ttl
+    )
+
+def _fetch_driving_route(origin_str, destination_str, avoid_tolls=False, use_live_traffic=True):
+    directions = get_client().directions(
         origin_str,
         destination_str,
         mode="driving",
@@ -36,7 +63,7 @@ def get_driving_route(origin_str, destination_str, avoid_tolls=False, use_live_t
     }
 
 def get_transit_route(origin_str, destination_str):
-    directions = gmaps.directions(
+    directions = get_client().directions(
         origin_str,
         destination_str,
         mode="transit",
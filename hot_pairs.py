@@ -0,0 +1,216 @@
+"""
+Precomputed routes for the NYC-area origin/destination pairs most trips use.
+
+hot_pairs.json lists the places (boroughs, airports, Penn Station, GWB and
+the tunnels); `python hot_pairs.py build` routes every pair with and without
+tolls, plans stops along each route and writes a gzipped JSON table that
+the app loads once per process. Trips whose endpoints fall within a place's
+snap radius are answered from the table instead of ORS.
+
+Only that command builds the first table. Once one exists, the app
+refreshes it in the background every REFRESH_INTERVAL, from one process
+at a time and at BUILD_ROUTE_RATE ORS routes per second, so refreshes do
+not compete with user traffic for the ORS quota.
+"""
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+from openrouteservice_api import ROUTE_VARIANTS, _fetch_driving_route
+from rate_limit import TokenBucket
+from spatial_index import haversine_km
+
+CONFIG_PATH = os.getenv("HOT_PAIRS_CONFIG", "hot_pairs.json")
+TABLE_PATH = os.getenv("HOT_PAIRS_TABLE", "hot_pairs_table.json.gz")
+REFRESH_INTERVAL = float(os.getenv("HOT_PAIRS_REFRESH_INTERVAL", 6 * 3600))  # seconds; 0 disables background refresh
+BUILD_ROUTE_RATE = float(os.getenv("HOT_PAIRS_BUILD_ROUTE_RATE", 0.25))  # ORS routes per second in background refreshes
+DEFAULT_MPG = 22  # matches the form default; run_trip recomputes gas cost for the user's mpg
+LOCK_PATH = f"{TABLE_PATH}.lock"  # held by the one process running a background refresh
+
+_table = None  # {"built_at", "places", "pairs": {(origin name, destination name): entry}}
+_table_mtime = None
+_table_lock = threading.Lock()
+_refresh_timer = None
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path) as f:
+        config = json.load(f)
+    for place in config["origins"] + config["destinations"]:
+        place.setdefault("snap_km", config.get("snap_km", 1.0))
+    return config
+
+
+def iter_pairs(config):
+    for o in config["origins"]:
+        for d in config["destinations"]:
+            yield o, d
+            if config.get("both_directions"):
+                yield d, o
+
+
+def _build_entry(origin, dest, stop_counts, bucket=None):
+    from trip_pipeline import _is_degraded, _plan_stops, estimate_gas_cost
+
+    routes, stops = {}, {}
+    for variant, avoid_tolls in ROUTE_VARIANTS.items():
+        if bucket is not None:
+            bucket.acquire()
+        route = _fetch_driving_route((origin["lat"], origin["lon"]), (dest["lat"], dest["lon"]), avoid_tolls)
+        if route is None:
+            continue
+        routes[variant] = dict(route, gas_cost=estimate_gas_cost(route["distance_miles"], DEFAULT_MPG))
+        stops[variant] = {str(n): _plan_stops(route["polyline"], n) for n in stop_counts}
+        if any(_is_degraded(s) for s in stops[variant].values()):
+            raise RuntimeError("corridor POI search failed")  # keep the previous entry rather than fallback stops
+    return {"origin": origin["name"], "destination": dest["name"], "routes": routes, "stops": stops}
+
+
+def build_table(config_path=CONFIG_PATH, path=TABLE_PATH, route_rate=None):
+    """
+    Route every configured pair and write the table. Pairs that fail keep
+    their entry from the previous table, if there is one. route_rate caps
+    ORS routes per second (each followed by its stop lists); None does not
+    throttle.
+    """
+    bucket = TokenBucket(route_rate, 1) if route_rate else None
+    config = load_config(config_path)
+    previous = _read_table(path) if os.path.exists(path) else {"pairs": {}}
+    pairs, failed = [], 0
+    for origin, dest in iter_pairs(config):
+        try:
+            pairs.append(_build_entry(origin, dest, config.get("stop_counts", []), bucket))
+        except Exception:
+            failed += 1
+            old = previous["pairs"].get((origin["name"], dest["name"]))
+            if old is not None:
+                pairs.append(old)
+    table = {"built_at": time.time(), "places": config["origins"] + config["destinations"], "pairs": pairs}
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(table, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return len(pairs), failed
+
+
+def _read_table(path=TABLE_PATH):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        table = json.load(f)
+    places = {}
+    for place in table["places"]:
+        places.setdefault(place["name"], place)
+    return {
+        "built_at": table["built_at"],
+        "places": list(places.values()),
+        "pairs": {(e["origin"], e["destination"]): e for e in table["pairs"]}
+    }
+
+
+def get_table():
+    """
+    The loaded table, read from disk on first use and again whenever the
+    file is rebuilt (possibly by another process); None when no table has
+    been built. Once a table exists, also starts the background refresh
+    timer once per process.
+    """
+    global _table, _table_mtime
+    try:
+        mtime = os.path.getmtime(TABLE_PATH)
+    except OSError:
+        mtime = None
+    if _table is not None and mtime == _table_mtime:
+        return _table
+    with _table_lock:
+        if mtime is not None and mtime != _table_mtime:
+            try:
+                _table, _table_mtime = _read_table(), mtime
+            except (OSError, ValueError, KeyError):
+                pass  # keep serving the previous table
+        if REFRESH_INTERVAL > 0 and _refresh_timer is None and _table is not None:
+            _schedule_refresh(_refresh_delay(_table["built_at"]))
+    return _table
+
+
+def _snap(places, lat, lon):
+    """
+    Places whose snap radius covers (lat, lon), as (distance_km, place), nearest first.
+    """
+    hits = [(haversine_km(lat, lon, p["lat"], p["lon"]), p) for p in places]
+    return sorted((h for h in hits if h[0] <= h[1]["snap_km"]), key=lambda h: h[0])
+
+
+def lookup(origin_coords, dest_coords):
+    """
+    The precomputed entry for a trip whose endpoints both snap onto a hot
+    pair: {"origin", "destination", "routes": {variant: route},
+    "stops": {variant: {"<count>": stops}}}, or None. Where snap areas
+    overlap (Penn Station is in Midtown) the closest pair that exists wins.
+    """
+    table = get_table()
+    if not table:
+        return None
+    candidates = [
+        (d_o + d_d, table["pairs"].get((o["name"], d["name"])))
+        for d_o, o in _snap(table["places"], *origin_coords)
+        for d_d, d in _snap(table["places"], *dest_coords)
+    ]
+    found = [c for c in candidates if c[1] is not None]
+    return min(found, key=lambda c: c[0])[1] if found else None
+
+
+def _refresh_delay(built_at):
+    return max(0, built_at + REFRESH_INTERVAL - time.time())
+
+
+def _claim_refresh():
+    """
+    Create the refresh lock file, so only one process (or replica sharing
+    the disk) rebuilds the table. A lock older than REFRESH_INTERVAL was
+    left by a crashed refresh and is taken over.
+    """
+    try:
+        if time.time() - os.path.getmtime(LOCK_PATH) > REFRESH_INTERVAL:
+            os.remove(LOCK_PATH)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _scheduled_refresh():
+    try:
+        built_at = _read_table()["built_at"]  # another process may have refreshed it meanwhile
+    except (OSError, ValueError, KeyError):
+        built_at = 0
+    delay = _refresh_delay(built_at)
+    if delay == 0 and _claim_refresh():
+        try:
+            build_table(route_rate=BUILD_ROUTE_RATE)  # picked up by get_table through the new mtime
+        except Exception:
+            pass  # keep serving the previous table
+        finally:
+            os.remove(LOCK_PATH)
+        delay = REFRESH_INTERVAL
+    elif delay == 0:
+        delay = min(REFRESH_INTERVAL, 600)  # another process is refreshing; check again later
+    _schedule_refresh(delay)
+
+
+def _schedule_refresh(delay):
+    global _refresh_timer
+    _refresh_timer = threading.Timer(delay, _scheduled_refresh)
+    _refresh_timer.daemon = True
+    _refresh_timer.start()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "build":
+        sys.exit("usage: python hot_pairs.py build")
+    built, failed = build_table()
+    print(f"{built} pairs ({failed} failed) -> {TABLE_PATH}")
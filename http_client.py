@@ -0,0 +1,212 @@
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limit
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 15))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))  # seconds
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 20))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_latency = {}
+_latency_lock = threading.Lock()
+
+
+def _parse_overrides(spec):
+    overrides = {}
+    for item in filter(None, spec.split(",")):
+        host, _, base_url = item.partition("=")
+        overrides[host.strip()] = base_url.strip().rstrip("/")
+    return overrides
+
+# host -> base URL, e.g. HTTP_HOST_OVERRIDES="api.open-meteo.com=http://127.0.0.1:8765/api.open-meteo.com"
+_overrides = _parse_overrides(os.getenv("HTTP_HOST_OVERRIDES", ""))
+
+
+def override_host(host, base_url):
+    """
+    Send every request for host to base_url instead, e.g. a local stub server.
+    The original path and query string are appended to base_url.
+    """
+    _overrides[host] = base_url.rstrip("/")
+
+
+def clear_overrides():
+    _overrides.clear()
+
+
+# host -> semaphore capping concurrent requests, shared across worker processes (see worker_pool)
+_host_slots = {}
+
+
+def limit_concurrency(host, semaphore):
+    _host_slots[host] = semaphore
+
+
+def host_slot(host):
+    """
+    Context manager holding one of host's concurrency slots, if it is limited.
+    """
+    return _host_slots.get(host) or nullcontext()
+
+
+def _session_for(scheme, host):
+    key = (scheme, host)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount(f"{scheme}://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def _record_latency(endpoint, seconds):
+    with _latency_lock:
+        hist = _latency.get(endpoint)
+        if hist is None:
+            hist = _latency[endpoint] = {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "count": 0, "sum": 0.0}
+        hist["buckets"][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        hist["count"] += 1
+        hist["sum"] += seconds
+
+
+def latency_snapshot():
+    """
+    Return {endpoint: {"buckets": [...], "count": n, "sum": seconds}}.
+    buckets[i] counts requests that took at most LATENCY_BUCKETS[i] seconds;
+    the final bucket counts everything slower than the largest bound.
+    """
+    with _latency_lock:
+        return {k: {"buckets": list(v["buckets"]), "count": v["count"], "sum": v["sum"]} for k, v in _latency.items()}
+
+
+def latency_since(before):
+    """
+    The requests recorded since the latency_snapshot() before, in the same shape.
+    """
+    delta = {}
+    for endpoint, hist in latency_snapshot().items():
+        old = before.get(endpoint, {"buckets": [0] * len(hist["buckets"]), "count": 0, "sum": 0.0})
+        if hist["count"] > old["count"]:
+            delta[endpoint] = {
+                "buckets": [a - b for a, b in zip(hist["buckets"], old["buckets"])],
+                "count": hist["count"] - old["count"],
+                "sum": hist["sum"] - old["sum"],
+            }
+    return delta
+
+
+def merge_latency(snapshot):
+    """
+    Add histograms recorded elsewhere (e.g. by a worker process) to this process's.
+    """
+    with _latency_lock:
+        for endpoint, other in snapshot.items():
+            hist = _latency.get(endpoint)
+            if hist is None:
+                hist = _latency[endpoint] = {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "count": 0, "sum": 0.0}
+            hist["buckets"] = [a + b for a, b in zip(hist["buckets"], other["buckets"])]
+            hist["count"] += other["count"]
+            hist["sum"] += other["sum"]
+
+
+def _retry_after(res):
+    value = res.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt):
+    # Full jitter: uniform between 0 and the exponential ceiling
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(method, url, **kwargs):
+    """
+    Drop-in replacement for requests.request with pooled keep-alive sessions,
+    default timeouts, per-host rate limiting and retries on 429/5xx and
+    connection errors. The last response (or exception) is returned (raised)
+    once the retries are used up. retry_timeouts=False raises read timeouts
+    straight away, for slow queries where a retry would only wait again.
+    """
+    parsed = urlparse(url)
+    endpoint = f"{parsed.netloc}{parsed.path}"
+    base_url = _overrides.get(parsed.netloc)
+    if base_url:
+        url = base_url + url[len(f"{parsed.scheme}://{parsed.netloc}"):]
+        target = urlparse(url)
+        session = _session_for(target.scheme, target.netloc)
+    else:
+        session = _session_for(parsed.scheme, parsed.netloc)
+    retry_timeouts = kwargs.pop("retry_timeouts", True)
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    bucket = rate_limit.for_host(parsed.netloc)
+
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        start = time.perf_counter()
+        try:
+            with host_slot(parsed.netloc):
+                res = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record_latency(endpoint, time.perf_counter() - start)
+            if attempt == MAX_RETRIES or (not retry_timeouts and isinstance(e, requests.ReadTimeout)):
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        _record_latency(endpoint, time.perf_counter() - start)
+
+        if res.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return res
+        delay = _retry_after(res)
+        time.sleep(min(BACKOFF_MAX, delay) if delay is not None else _backoff(attempt))
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def prometheus_histograms(prefix="transportnyc_http_request_seconds"):
+    """
+    Per-endpoint latency histograms in Prometheus text exposition format.
+    """
+    lines = [f"# HELP {prefix} Outbound HTTP request latency by endpoint.", f"# TYPE {prefix} histogram"]
+    for endpoint, hist in sorted(latency_snapshot().items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ["+Inf"], hist["buckets"]):
+            cumulative += count
+            lines.append(f'{prefix}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_sum{{endpoint="{endpoint}"}} {hist["sum"]:.6f}')
+        lines.append(f'{prefix}_count{{endpoint="{endpoint}"}} {hist["count"]}')
+    return "\n".join(lines) + "\n"
@@ -1,29 +1,81 @@
 import openrouteservice
 from openrouteservice import convert
-import requests
+import http_client
 import os
 import streamlit as st
 import math
+import threading
 import polyline as pl
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import RequestException
+try:
+    import numpy as np
+    from route_geometry import RouteGeometry, haversine_np
+except ImportError:  # NumPy missing: pure-Python fallback in get_interval_coords
+    np = RouteGeometry = None
+import route_cache
+import tracing
 
 
 ORS_API_KEY = os.getenv("ORS_API_KEY")
-client = openrouteservice.Client(key=ORS_API_KEY)
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+POI_MAX_WORKERS = int(os.getenv("POI_MAX_WORKERS", 8))
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "ors")  # "ors" or "local" (see local_router.py)
+MATRIX_MAX_LOCATIONS = int(os.getenv("ORS_MATRIX_MAX_LOCATIONS", 50))  # sources + destinations per request
+FALLBACK_SPEED_MPH = 35  # straight-line estimate used when ORS is unreachable
+FALLBACK_DETOUR_FACTOR = 1.3  # road distance / great-circle distance
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org")  # point at a stub server for offline runs
+ORS_HOST = "api.openrouteservice.org"  # provider name for http_client.host_slot, whatever ORS_BASE_URL is
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The shared ORS client, created on first use rather than at import.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = openrouteservice.Client(key=ORS_API_KEY, base_url=ORS_BASE_URL)
+    return _client
+
+
+@tracing.traced("ors.get_driving_route")
 def get_driving_route(origin_coords, dest_coords, avoid_tolls=False):
+    if ROUTING_BACKEND == "local":
+        import local_router
+        return local_router.get_driving_route(origin_coords, dest_coords, avoid_tolls)
+    key = route_cache.make_key("ors", origin_coords, dest_coords, avoid_tolls=avoid_tolls, profile="driving-car")
+    return route_cache.get_or_compute(key, lambda: _fetch_driving_route(origin_coords, dest_coords, avoid_tolls))
+
+def _fetch_driving_route(origin_coords, dest_coords, avoid_tolls=False):
+    routes = _fetch_driving_routes(origin_coords, dest_coords, avoid_tolls)
+    return routes[0] if routes else None
+
+def _fetch_driving_routes(origin_coords, dest_coords, avoid_tolls=False, alternatives=0):
     options = {}
     if avoid_tolls:
         options["avoid_features"] = ["tollways"]
 
-    route = client.directions(
-        coordinates=[origin_coords[::-1], dest_coords[::-1]],
-        profile='driving-car',
-        format='json',
-        instructions=True,
-        options=options
-    )
+    extra = {}
+    if alternatives:
+        extra["alternative_routes"] = {"target_count": alternatives + 1, "share_factor": 0.6, "weight_factor": 1.4}
+
+    with http_client.host_slot(ORS_HOST):
+        route = get_client().directions(
+            coordinates=[origin_coords[::-1], dest_coords[::-1]],
+            profile='driving-car',
+            format='json',
+            instructions=True,
+            options=options,
+            **extra
+        )
+    return [_parse_route(route_info) for route_info in route['routes']]
 
-    route_info = route['routes'][0]
+def _parse_route(route_info):
     steps = route_info['segments'][0]['steps']
     duration_sec = route_info['summary']['duration']
     distance_m = route_info['summary']['distance']
@@ -37,6 +89,137 @@ def get_driving_route(origin_coords, dest_coords, avoid_tolls=False):
         "traffic_color": "gray"
     }
 
+ROUTE_VARIANTS = {"tolls": False, "no_tolls": True}  # variant name -> avoid_tolls
+
+@tracing.traced("ors.get_route_variants")
+def get_route_variants(origin_coords, dest_coords, variants=("tolls", "no_tolls"), alternatives=0):
+    """
+    Fetch every requested variant ("tolls", "no_tolls") in one go and return
+    scored candidate dicts, best first. ORS cannot mix avoid options in a
+    single request, so variants are requested concurrently; alternatives > 0
+    additionally asks ORS for that many alternative routes per variant.
+    Each candidate is a get_driving_route dict plus "variant", "alternative",
+    "score" (duration relative to the fastest candidate) and "geometry", the
+    RouteGeometry decoded once per distinct polyline (None without NumPy).
+    """
+    def fetch(variant):
+        avoid_tolls = ROUTE_VARIANTS[variant]
+        if not alternatives or ROUTING_BACKEND == "local":
+            route = get_driving_route(origin_coords, dest_coords, avoid_tolls=avoid_tolls)
+            return [route] if route else []
+        key = route_cache.make_key("ors", origin_coords, dest_coords, avoid_tolls=avoid_tolls,
+                                   profile="driving-car", alternatives=alternatives)
+        try:
+            return route_cache.get_or_compute(
+                key, lambda: _fetch_driving_routes(origin_coords, dest_coords, avoid_tolls, alternatives)
+            ) or []
+        except openrouteservice.exceptions.ApiError:
+            # ORS rejects alternative_routes on long trips; fall back to the single best route
+            route = get_driving_route(origin_coords, dest_coords, avoid_tolls=avoid_tolls)
+            return [route] if route else []
+
+    with ThreadPoolExecutor(max_workers=max(1, len(variants))) as pool:
+        fetched = list(pool.map(tracing.propagate(fetch), variants))
+
+    candidates = []
+    for variant, routes in zip(variants, fetched):
+        for i, route in enumerate(routes):
+            geometry = RouteGeometry.from_polyline(route["polyline"]) if RouteGeometry else None
+            candidates.append(dict(route, variant=variant, alternative=i, geometry=geometry))
+
+    if candidates:
+        fastest = min(c["duration_mins"] for c in candidates) or 1.0
+        for c in candidates:
+            c["score"] = round(c["duration_mins"] / fastest, 3)
+    candidates.sort(key=lambda c: c["score"])
+    return candidates
+
+
+@tracing.traced("ors.get_duration_matrix")
+def get_duration_matrix(origins, destinations, avoid_tolls=False):
+    """
+    Travel times and distances from every origin to every destination.
+    Returns (durations_mins, distances_miles, estimated) NumPy arrays of
+    shape (len(origins), len(destinations)); unreachable cells are NaN and
+    estimated marks cells filled from the straight-line fallback because
+    ORS could not be reached. Cells are cached individually, and ORS
+    requests are chunked to stay within MATRIX_MAX_LOCATIONS.
+    """
+    shape = (len(origins), len(destinations))
+    durations, distances = np.full(shape, np.nan), np.full(shape, np.nan)
+    estimated = np.zeros(shape, dtype=bool)
+    keys = {
+        (i, j): route_cache.make_key("ors-matrix", o, d, avoid_tolls=avoid_tolls, profile="driving-car")
+        for i, o in enumerate(origins) for j, d in enumerate(destinations)
+    }
+    cached = route_cache.get_many(list(keys.values()))
+    missing = []
+    for cell, key in keys.items():
+        if key in cached:
+            durations[cell], distances[cell] = cached[key]
+        else:
+            missing.append(cell)
+    if not missing:
+        return durations, distances, estimated
+
+    try:
+        if avoid_tolls:
+            # The matrix endpoint has no avoid_features option; route the missing cells individually
+            fetched = _matrix_cells_by_route(origins, destinations, missing)
+        else:
+            fetched = _matrix_cells_by_ors(origins, destinations, missing)
+    except (RequestException, openrouteservice.exceptions.Timeout, openrouteservice.exceptions.HTTPError):
+        o = np.array([origins[i] for i, _ in missing], dtype=float)
+        d = np.array([destinations[j] for _, j in missing], dtype=float)
+        miles = haversine_np(o[:, 0], o[:, 1], d[:, 0], d[:, 1]) / 1609.34 * FALLBACK_DETOUR_FACTOR
+        rows, cols = zip(*missing)
+        distances[rows, cols] = miles
+        durations[rows, cols] = miles / FALLBACK_SPEED_MPH * 60
+        estimated[rows, cols] = True
+        return durations, distances, estimated
+
+    for cell, value in fetched.items():
+        durations[cell], distances[cell] = value
+    route_cache.put_many([(keys[cell], value) for cell, value in fetched.items() if None not in value])
+    return durations, distances, estimated
+
+
+def _matrix_cells_by_ors(origins, destinations, missing):
+    rows = sorted({i for i, _ in missing})
+    cols = sorted({j for _, j in missing})
+    half = max(1, MATRIX_MAX_LOCATIONS // 2)
+    fetched = {}
+    for r in range(0, len(rows), half):
+        for c in range(0, len(cols), half):
+            row_chunk, col_chunk = rows[r:r + half], cols[c:c + half]
+            locations = [origins[i][::-1] for i in row_chunk] + [destinations[j][::-1] for j in col_chunk]
+            with http_client.host_slot(ORS_HOST):
+                res = get_client().distance_matrix(
+                    locations=locations,
+                    profile="driving-car",
+                    sources=list(range(len(row_chunk))),
+                    destinations=list(range(len(row_chunk), len(locations))),
+                    metrics=["duration", "distance"],
+                    units="mi"
+                )
+            for a, i in enumerate(row_chunk):
+                for b, j in enumerate(col_chunk):
+                    seconds, miles = res["durations"][a][b], res["distances"][a][b]
+                    fetched[(i, j)] = (None if seconds is None else seconds / 60, miles)
+    return {cell: fetched[cell] for cell in missing}
+
+
+def _matrix_cells_by_route(origins, destinations, missing):
+    def run(cell):
+        try:
+            route = get_driving_route(origins[cell[0]], destinations[cell[1]], avoid_tolls=True)
+        except openrouteservice.exceptions.ApiError:
+            route = None  # unroutable pair: NaN like the matrix endpoint, not a failed call
+        return cell, (route["duration_mins"], route["distance_miles"]) if route else (None, None)
+
+    with ThreadPoolExecutor(max_workers=min(POI_MAX_WORKERS, len(missing))) as pool:
+        return dict(pool.map(tracing.propagate(run), missing))
+
 
 def haversine(coord1, coord2):
     R = 6371e3  # Earth radius in meters
@@ -47,8 +230,21 @@ def haversine(coord1, coord2):
     a = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
 
-def get_interval_coords(polyline_str, num_intervals):
-    coords = pl.decode(polyline_str)
+@tracing.traced("get_interval_coords")
+def get_interval_coords(polyline_str, num_intervals, interpolate=False):
+    """
+    Return num_intervals evenly spaced points along the route.
+    By default each point snaps to the first vertex at or past its target
+    distance; interpolate=True places it exactly on the segment instead.
+    Uses the cached RouteGeometry (NumPy) when available and falls back to
+    the pure-Python version.
+    """
+    if RouteGeometry is not None:
+        return RouteGeometry.from_polyline(polyline_str).interval_points(num_intervals, interpolate)
+    return _interval_coords_scalar(pl.decode(polyline_str), num_intervals, interpolate)
+
+
+def _interval_coords_scalar(coords, num_intervals, interpolate=False):
     total_dist = 0
     dists = [0]
 
@@ -66,13 +262,22 @@ def get_interval_coords(polyline_str, num_intervals):
 
     for i in range(1, len(dists)):
         while j <= num_intervals and dists[i] >= next_target:
-            result.append(coords[i])
+            if interpolate:
+                seg_len = dists[i] - dists[i - 1]
+                frac = (next_target - dists[i - 1]) / seg_len if seg_len > 0 else 0.0
+                result.append((
+                    coords[i - 1][0] + (coords[i][0] - coords[i - 1][0]) * frac,
+                    coords[i - 1][1] + (coords[i][1] - coords[i - 1][1]) * frac
+                ))
+            else:
+                result.append(coords[i])
             j += 1
             next_target = step_dist * j
 
     return result
 
 
+@tracing.traced("nominatim.search_nearby_pois")
 def search_nearby_pois(lat, lon, kind, delta=0.1):
     keyword_map = {
         "gas": "gas station",
@@ -83,7 +288,7 @@ def search_nearby_pois(lat, lon, kind, delta=0.1):
 
     viewbox = f"{lon - delta},{lat - delta},{lon + delta},{lat + delta}"
 
-    url = "https://nominatim.openstreetmap.org/search"
+    url = NOMINATIM_URL
     params = {
         "q": query,
         "format": "json",
@@ -93,5 +298,31 @@ def search_nearby_pois(lat, lon, kind, delta=0.1):
     }
     headers = {"User-Agent": "TransportNYC-App"}
 
-    res = requests.get(url, params=params, headers=headers)
+    res = http_client.get(url, params=params, headers=headers)
     return res.json() if res.status_code == 200 else []
+
+
+@tracing.traced("nominatim.search_nearby_pois_batch")
+def search_nearby_pois_batch(points, kinds, delta=0.1):
+    """
+    Look up every kind of POI around every point concurrently.
+    Returns one {kind: results} dict per point, in the same order as points.
+    Requests are throttled per host by http_client, so the public Nominatim
+    instance still sees at most one request per second.
+    """
+    jobs = [(i, kind, lat, lon) for i, (lat, lon) in enumerate(points) for kind in kinds]
+    results = [{kind: [] for kind in kinds} for _ in points]
+    if not jobs:
+        return results
+
+    def run(job):
+        i, kind, lat, lon = job
+        try:
+            return i, kind, search_nearby_pois(lat, lon, kind, delta)
+        except Exception:
+            return i, kind, []
+
+    with ThreadPoolExecutor(max_workers=min(POI_MAX_WORKERS, len(jobs))) as pool:
+        for i, kind, pois in pool.map(tracing.propagate(run), jobs):
+            results[i][kind] = pois
+    return results
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+
+import http_client
+import tracing
+from route_geometry import EARTH_RADIUS_M, RouteGeometry, haversine_np
+from spatial_index import GridIndex, KM_PER_DEG
+
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+CORRIDOR_BUFFER_KM = 5.0  # POIs farther than this from the route are ignored
+DETOUR_SPEED_KMH = 50.0  # used to turn "within X minutes" into a search radius
+DEFAULT_REACH_MINS = 10
+RESULTS_PER_KIND = 3
+QUERY_TIMEOUT = 25  # seconds Overpass may spend on the query; the HTTP read waits a little longer
+
+# kind -> OSM tag key -> accepted values
+POI_TAGS = {
+    "gas": {"amenity": ["fuel"]},
+    "food": {"amenity": ["restaurant", "fast_food"]},
+    "hotel": {"tourism": ["hotel", "motel"]},
+}
+
+
+def _kind_of(tags, kinds):
+    for kind in kinds:
+        for key, values in POI_TAGS[kind].items():
+            if tags.get(key) in values:
+                return kind
+    return None
+
+
+def _display_name(tags, kind):
+    name = tags.get("name") or tags.get("brand") or kind.title()
+    place = ", ".join(filter(None, (tags.get("addr:street"), tags.get("addr:city"))))
+    return f"{name}, {place}" if place else name
+
+
+def build_query(stops, kinds, reach_km, bbox):
+    """
+    One Overpass QL query covering every kind around every stop, clipped to
+    the route's buffered bounding box.
+    """
+    (south, west), (north, east) = bbox
+    statements = []
+    for kind in kinds:
+        for key, values in POI_TAGS[kind].items():
+            for lat, lon in stops:
+                statements.append(f'nwr["{key}"~"^({"|".join(values)})$"](around:{int(reach_km * 1000)},{lat},{lon});')
+    return (
+        f"[out:json][timeout:{QUERY_TIMEOUT}][bbox:{south},{west},{north},{east}];\n"
+        "(\n" + "\n".join(statements) + "\n);\nout center tags;"
+    )
+
+
+def fetch_pois(query, kinds):
+    # A timed-out query is not retried: the caller falls back to Nominatim instead
+    res = http_client.post(
+        OVERPASS_URL, data={"data": query}, headers={"User-Agent": "TransportNYC-App"},
+        timeout=(http_client.CONNECT_TIMEOUT, QUERY_TIMEOUT + 5), retry_timeouts=False
+    )
+    res.raise_for_status()
+    pois = []
+    for el in res.json().get("elements", []):
+        center = el.get("center", el)
+        tags = el.get("tags", {})
+        kind = _kind_of(tags, kinds)
+        if kind is None or "lat" not in center:
+            continue
+        pois.append({
+            "kind": kind,
+            "lat": float(center["lat"]),
+            "lon": float(center["lon"]),
+            "display_name": _display_name(tags, kind),
+            "named": "name" in tags
+        })
+    return pois
+
+
+def _distance_to_route_km(geometry, lat, lon):
+    """
+    Distance from (lat, lon) to the nearest point on any route segment, on
+    a local equirectangular projection centred on the point (as in
+    route_geometry._douglas_peucker).
+    """
+    pts = geometry.points
+    if len(pts) < 2:
+        return float(haversine_np(lat, lon, pts[:, 0], pts[:, 1]).min()) / 1000
+    xy = np.radians(pts[:, ::-1] - (lon, lat)) * EARTH_RADIUS_M
+    xy[:, 0] *= np.cos(np.radians(lat))
+    a, ab = xy[:-1], np.diff(xy, axis=0)
+    length_sq = (ab ** 2).sum(axis=1)
+    t = np.clip(np.divide(-(a * ab).sum(axis=1), length_sq, out=np.zeros_like(length_sq), where=length_sq > 0), 0, 1)
+    closest = a + ab * t[:, None]
+    return float(np.hypot(closest[:, 0], closest[:, 1]).min()) / 1000
+
+
+@tracing.traced("overpass.search_corridor_pois")
+def search_corridor_pois(polyline_str, stops, kinds=("gas", "food", "hotel"), reach_mins=DEFAULT_REACH_MINS):
+    """
+    Find the best POIs of each kind within reach_mins of each planned stop
+    with a single bulk query, instead of one query per stop and kind.
+    Returns one {kind: [poi, ...]} dict per stop, in stop order; each poi
+    has display_name, lat, lon and distance_km, nearest (named first) first.
+    """
+    if not stops:
+        return []
+    geometry = RouteGeometry.from_polyline(polyline_str)
+    reach_km = DETOUR_SPEED_KMH * reach_mins / 60
+    pad = max(reach_km, CORRIDOR_BUFFER_KM) / KM_PER_DEG
+    lat_pad = pad
+    lon_pad = pad / max(np.cos(np.radians(geometry.points[:, 0]).min()), 0.1)
+    (south, west), (north, east) = geometry.bbox
+    bbox = ((south - lat_pad, west - lon_pad), (north + lat_pad, east + lon_pad))
+
+    pois = fetch_pois(build_query(stops, kinds, reach_km, bbox), kinds)
+    index = GridIndex(
+        ((p["lat"], p["lon"], p) for p in pois if _distance_to_route_km(geometry, p["lat"], p["lon"]) <= CORRIDOR_BUFFER_KM),
+        cell_deg=0.05
+    )
+
+    results = []
+    for lat, lon in stops:
+        nearby = index.within_radius(lat, lon, reach_km)
+        by_kind = {kind: [] for kind in kinds}
+        for d, poi in sorted(nearby, key=lambda x: (not x[1]["named"], x[0])):
+            if len(by_kind[poi["kind"]]) < RESULTS_PER_KIND:
+                by_kind[poi["kind"]].append(dict(poi, distance_km=round(d, 2)))
+        results.append(by_kind)
+    return results
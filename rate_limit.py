@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+# Requests per second and burst size per host. Nominatim's usage policy
+# allows at most one request per second from a single application, as
+# does the OpenCage free tier.
+HOST_LIMITS = {
+    "nominatim.openstreetmap.org": (1.0, 1),
+    "api.opencagedata.com": (1.0, 1),
+}
+DEFAULT_LIMIT = (10.0, 10)
+
+# Overrides, e.g. RATE_LIMITS="api.opencagedata.com=15/15,nominatim.example.org=50/10"
+for _item in filter(None, os.getenv("RATE_LIMITS", "").split(",")):
+    _host, _, _limit = _item.partition("=")
+    _rate, _, _burst = _limit.partition("/")
+    HOST_LIMITS[_host.strip()] = (float(_rate), float(_burst or 1))
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Block until the requested number of tokens is available, then consume them.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def for_host(host):
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            rate, capacity = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+            bucket = _buckets[host] = TokenBucket(rate, capacity)
+        return bucket
+
+
+def scale(factor):
+    """
+    Multiply every host's rate by factor, e.g. 1 / n when n processes share
+    the same upstream limits. Buckets created so far are discarded.
+    """
+    global DEFAULT_LIMIT
+    with _buckets_lock:
+        for host, (rate, capacity) in list(HOST_LIMITS.items()):
+            HOST_LIMITS[host] = (rate * factor, max(1, capacity * factor))
+        DEFAULT_LIMIT = (DEFAULT_LIMIT[0] * factor, max(1, DEFAULT_LIMIT[1] * factor))
+        _buckets.clear()
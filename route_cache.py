@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.getenv("ROUTE_CACHE_PATH", "route_cache.db")
+CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", 24 * 3600))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", 5000))
+COORD_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", 4))  # decimal places, ~11m
+BYPASS = os.getenv("ROUTE_CACHE_BYPASS", "0") == "1"
+
+stats = {"hits": 0, "misses": 0, "evictions": 0}
+_local = threading.local()
+_stats_lock = threading.Lock()
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_PATH, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS route_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_route_cache_access ON route_cache (last_access)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        stats[name] += n
+
+
+def quantize(coords, precision=None):
+    precision = COORD_PRECISION if precision is None else precision
+    return tuple(round(float(c), precision) for c in coords)
+
+
+def make_key(backend, origin, destination, **options):
+    """
+    Build a cache key from the backend name, both endpoints and routing options.
+    Coordinate tuples are quantized so nearby repeat lookups share an entry;
+    free-text addresses are normalized for case and whitespace.
+    """
+    def norm(point):
+        if isinstance(point, str):
+            return " ".join(point.lower().split())
+        return quantize(point)
+
+    opts = ",".join(f"{k}={options[k]}" for k in sorted(options))
+    return f"{backend}|{norm(origin)}|{norm(destination)}|{opts}"
+
+
+def get(key, ttl=None):
+    if BYPASS:
+        return None
+    ttl = CACHE_TTL if ttl is None else ttl
+    conn = _conn()
+    row = conn.execute("SELECT value, created_at FROM route_cache WHERE key = ?", (key,)).fetchone()
+    now = time.time()
+    if row is None or now - row[1] > ttl:
+        _count("misses")
+        return None
+    conn.execute("UPDATE route_cache SET last_access = ? WHERE key = ?", (now, key))
+    conn.commit()
+    _count("hits")
+    return json.loads(row[0])
+
+
+def put(key, value):
+    put_many([(key, value)])
+
+
+def get_many(keys, ttl=None):
+    """
+    Look up several keys at once; returns {key: value} for the fresh hits.
+    """
+    if BYPASS or not keys:
+        return {}
+    ttl = CACHE_TTL if ttl is None else ttl
+    conn = _conn()
+    now = time.time()
+    found = {}
+    for i in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+        chunk = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT key, value, created_at FROM route_cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        found.update((key, json.loads(value)) for key, value, created_at in rows if now - created_at <= ttl)
+    if found:
+        conn.executemany("UPDATE route_cache SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+        conn.commit()
+    _count("hits", len(found))
+    _count("misses", len(keys) - len(found))
+    return found
+
+
+def put_many(items):
+    """
+    Store several (key, value) pairs in one transaction.
+    """
+    if BYPASS or not items:
+        return
+    conn = _conn()
+    now = time.time()
+    conn.executemany(
+        "INSERT OR REPLACE INTO route_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+        [(key, json.dumps(value), now, now) for key, value in items]
+    )
+    overflow = conn.execute("SELECT COUNT(*) FROM route_cache").fetchone()[0] - CACHE_MAX_ENTRIES
+    if overflow > 0:
+        conn.execute(
+            "DELETE FROM route_cache WHERE key IN (SELECT key FROM route_cache ORDER BY last_access LIMIT ?)",
+            (overflow,)
+        )
+        _count("evictions", overflow)
+    conn.commit()
+
+
+def get_or_compute(key, compute, ttl=None):
+    """
+    Return the cached value for key, or call compute() and store its result.
+    None results (failed lookups) are never cached.
+    """
+    value = get(key, ttl)
+    if value is not None:
+        return value
+    value = compute()
+    if value is not None:
+        put(key, value)
+    return value
+
+
+def set_bypass(enabled):
+    global BYPASS
+    BYPASS = bool(enabled)
+
+
+def clear():
+    conn = _conn()
+    conn.execute("DELETE FROM route_cache")
+    conn.commit()
+
+
+def purge_expired(ttl=None):
+    ttl = CACHE_TTL if ttl is None else ttl
+    conn = _conn()
+    cur = conn.execute("DELETE FROM route_cache WHERE created_at < ?", (time.time() - ttl,))
+    conn.commit()
+    return cur.rowcount
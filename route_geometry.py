@@ -0,0 +1,166 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+import polyline as pl
+
+EARTH_RADIUS_M = 6371e3
+TILE_SIZE = 256
+MAP_SIZE_PX = (700, 400)  # st_folium width/height used by the app
+ZOOM_HEADROOM = 2  # keep detail for this many zoom levels past the initial view
+
+
+def haversine_np(lats1, lons1, lats2, lons2):
+    R = EARTH_RADIUS_M
+    lat1, lon1, lat2, lon2 = map(np.radians, (lats1, lons1, lats2, lons2))
+    dlat, dlon = lat2 - lat1, lon2 - lon1
+
+    a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+
+class RouteGeometry:
+    """
+    A decoded route polyline stored as one (N, 2) float array of (lat, lon).
+    Cumulative distances, the bounding box and simplified versions are
+    computed on first use and kept on the object.
+    """
+
+    def __init__(self, coords):
+        self.points = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self._cumdist = None
+        self._simplified = {}
+
+    @classmethod
+    def from_polyline(cls, polyline_str):
+        return _from_polyline(polyline_str)
+
+    def __len__(self):
+        return len(self.points)
+
+    def as_list(self):
+        return [tuple(p) for p in self.points.tolist()]
+
+    @property
+    def cumulative_distances(self):
+        """
+        Distance in meters from the start to each vertex.
+        """
+        if self._cumdist is None:
+            pts = self.points
+            seg = haversine_np(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+            self._cumdist = np.concatenate(([0.0], np.cumsum(seg)))
+        return self._cumdist
+
+    @property
+    def total_distance(self):
+        return float(self.cumulative_distances[-1]) if len(self) else 0.0
+
+    @property
+    def bbox(self):
+        """
+        [[south, west], [north, east]], the shape folium's fit_bounds expects;
+        None for an empty route.
+        """
+        if not len(self):
+            return None
+        lo, hi = self.points.min(axis=0), self.points.max(axis=0)
+        return [[float(lo[0]), float(lo[1])], [float(hi[0]), float(hi[1])]]
+
+    def fit_zoom(self, size_px=MAP_SIZE_PX):
+        """
+        Web-Mercator zoom level at which the whole route fits in size_px.
+        """
+        (south, west), (north, east) = self.bbox
+        lon_span = max(east - west, 1e-6)
+        y = lambda lat: math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+        lat_span = max(abs(y(north) - y(south)), 1e-6)
+        zoom_x = math.log2(size_px[0] * 360 / (TILE_SIZE * lon_span))
+        zoom_y = math.log2(size_px[1] * 2 * math.pi / (TILE_SIZE * lat_span))
+        return max(0, min(18, int(min(zoom_x, zoom_y))))
+
+    def tolerance_for_zoom(self, zoom):
+        """
+        Ground size in meters of one screen pixel at zoom, ZOOM_HEADROOM levels in.
+        """
+        mid_lat = float(self.points[:, 0].mean())
+        return 156543.03 * math.cos(math.radians(mid_lat)) / 2 ** (zoom + ZOOM_HEADROOM)
+
+    def simplify(self, tolerance_m):
+        """
+        Douglas-Peucker simplification; no dropped vertex is farther than
+        tolerance_m from the simplified line. Returns a list of (lat, lon).
+        """
+        key = round(tolerance_m, 3)
+        if key not in self._simplified:
+            self._simplified[key] = [tuple(p) for p in self.points[_douglas_peucker(self.points, tolerance_m)].tolist()]
+        return self._simplified[key]
+
+    def for_map(self, size_px=MAP_SIZE_PX):
+        if not len(self):
+            return []
+        return self.simplify(self.tolerance_for_zoom(self.fit_zoom(size_px)))
+
+    def interval_points(self, num_intervals, interpolate=False):
+        """
+        num_intervals evenly spaced points along the route, snapped to the
+        first vertex reaching each target distance unless interpolate is set.
+        """
+        if num_intervals <= 0 or len(self) < 2:
+            return []
+        pts = self.points
+        dists = self.cumulative_distances
+        targets = dists[-1] / (num_intervals + 1) * np.arange(1, num_intervals + 1)
+        # First vertex (after the start) whose cumulative distance reaches each target
+        idx = np.searchsorted(dists[1:], targets, side="left") + 1
+        idx = idx[idx < len(dists)]
+        if not interpolate:
+            return [tuple(p) for p in pts[idx].tolist()]
+
+        targets = targets[:len(idx)]
+        seg_len = dists[idx] - dists[idx - 1]
+        frac = np.divide(targets - dists[idx - 1], seg_len, out=np.zeros_like(seg_len), where=seg_len > 0)
+        out = pts[idx - 1] + (pts[idx] - pts[idx - 1]) * frac[:, None]
+        return [tuple(p) for p in out.tolist()]
+
+
+@lru_cache(maxsize=64)
+def _from_polyline(polyline_str):
+    return RouteGeometry(pl.decode(polyline_str))
+
+
+def _douglas_peucker(points, tolerance_m):
+    """
+    Indices of the vertices kept by Douglas-Peucker, in order.
+    Works on a local equirectangular projection, which is accurate to well
+    under a pixel at the tolerances used for map rendering.
+    """
+    n = len(points)
+    if n <= 2:
+        return np.arange(n)
+    mid_lat = math.radians(float(points[:, 0].mean()))
+    xy = np.radians(points[:, ::-1]) * EARTH_RADIUS_M
+    xy[:, 0] *= math.cos(mid_lat)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        inner = xy[start + 1:end]
+        ab = b - a
+        length = math.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_m:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
@@ -0,0 +1,159 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+import tracing
+
+MODEL = os.getenv("ROUTER_AI_MODEL", "gpt-3.5-turbo")  # "stub" answers offline, for tests and benchmarks
+STUB_DELAY = float(os.getenv("ROUTER_AI_STUB_DELAY", 0.02))  # seconds per streamed stub word
+CACHE_TTL = 6 * 3600  # seconds
+CACHE_MAX_ENTRIES = 1024
+SYSTEM_PROMPT = "You are RouterAI, a friendly and knowledgeable transportation assistant, especially on specific routes and the weather/traffic conditions along them and what food, gas, and lodging options there are. You also know what routes are scenic and not...."
+
+# Words that do not change what is being asked ("is it scenic?" == "is the route scenic")
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "it", "its", "this", "that", "route", "trip", "drive", "my", "me", "i",
+    "please", "can", "could", "you", "tell", "what", "whats", "s", "there", "any", "do", "does", "to", "of",
+}
+
+_cache = OrderedDict()  # (question key, context) -> (answered_at, answer); shared by every session
+_cache_lock = threading.Lock()
+_inflight = {}  # (question key, context) -> _Answer being generated
+stats = {"hits": 0, "coalesced": 0, "misses": 0}
+
+
+def question_key(question):
+    """
+    Normalize a question for caching: case, punctuation and filler words are
+    ignored. Word order is kept, since "JFK to Newark" is not "Newark to JFK".
+    """
+    # Hyphens inside words are kept, so road names like "I-95" stay whole
+    words = [w.strip("-") for w in re.sub(r"[^\w-]+", " ", question.lower()).split()]
+    words = [w for w in words if w]
+    return " ".join(w for w in words if w not in FILLER_WORDS) or " ".join(words)
+
+
+class _Answer:
+    """
+    An answer being streamed by one caller and read by any number of others.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.failed = False
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, failed=False):
+        with self._cond:
+            self.done, self.failed = True, failed
+            self._cond.notify_all()
+
+    def __iter__(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                if i >= len(self.chunks):
+                    return
+                chunk = self.chunks[i]
+            i += 1
+            yield chunk
+
+
+def _stub_completion(question, context):
+    answer = f"(stub) You asked: {question.strip()}"
+    if context:
+        answer += f" Trip context: {context}."
+    for word in answer.split(" "):
+        if STUB_DELAY:
+            time.sleep(STUB_DELAY)
+        yield word + " "
+
+
+def _openai_completion(question, context):
+    import openai  # deferred: only needed once a question is actually asked
+    openai.api_key = os.getenv("OPENAI_API_KEY") or st.secrets["OPENAI_API_KEY"]
+    system = SYSTEM_PROMPT + (f" Context: {context}" if context else "")
+    stream = openai.ChatCompletion.create(
+        model=MODEL,
+        messages=[{"role": "system", "content": system}, {"role": "user", "content": question}],
+        max_tokens=500,
+        temperature=0.25,
+        stream=True
+    )
+    for chunk in stream:
+        content = chunk.choices[0].delta.get("content")
+        if content:
+            yield content
+
+
+def _cache_get(key):
+    # Caller holds _cache_lock
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if time.time() - entry[0] > CACHE_TTL:
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return entry[1]
+
+
+def _generate(key, answer, question, context):
+    completion = _stub_completion if MODEL == "stub" else _openai_completion
+    failed = False
+    try:
+        with tracing.span("openai.ask_hustlerai"):
+            for chunk in completion(question, context):
+                answer.append(chunk)
+    except Exception as e:
+        failed = True
+        answer.append(f"Error from RouterAI: {e}")
+    with _cache_lock:
+        if not failed:
+            _cache[key] = (time.time(), "".join(answer.chunks).strip())
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+        _inflight.pop(key, None)
+    answer.finish(failed)
+
+
+def ask_stream(question, context=None):
+    """
+    Stream RouterAI's answer as text chunks. Cached answers come back in one
+    chunk; a question already being answered for the same context is
+    coalesced onto that single model call, and its chunks are replayed to
+    every waiting caller as they arrive. Failed answers are not cached.
+    """
+    key = (question_key(question), context or "")
+    with _cache_lock:
+        cached = _cache_get(key)
+        answer = _inflight.get(key)
+        leader = cached is None and answer is None
+        if leader:
+            answer = _inflight[key] = _Answer()
+        stats["hits" if cached is not None else "misses" if leader else "coalesced"] += 1
+    if cached is not None:
+        yield cached
+        return
+    if leader:
+        # Generate on a worker thread so the answer completes (and is cached)
+        # even if this caller stops reading, e.g. on a Streamlit rerun; the
+        # thread keeps this request's context so its span stays in the trace
+        threading.Thread(target=tracing.propagate(_generate), args=(key, answer, question, context), daemon=True).start()
+    yield from answer
+
+
+def ask(question, context=None):
+    return "".join(ask_stream(question, context)).strip()
@@ -0,0 +1,99 @@
+import math
+from heapq import nsmallest
+
+KM_PER_DEG = 111.195  # great-circle km per degree of latitude
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    dlat, dlon = lat2 - lat1, lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
+    return 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+
+class GridIndex:
+    """
+    Fixed-size lat/lon grid buckets for nearest-k and within-radius queries.
+    Items are (lat, lon, payload) tuples; queries only touch nearby cells.
+    """
+
+    def __init__(self, items=(), cell_deg=1.0):
+        self.cell = cell_deg
+        self.n_rows = math.ceil(180 / cell_deg) + 1
+        self.n_cols = math.ceil(360 / cell_deg)
+        self.cells = {}
+        self.size = 0
+        for lat, lon, payload in items:
+            self.add(lat, lon, payload)
+
+    def _cell(self, lat, lon):
+        return int((lat + 90) // self.cell), int((lon + 180) // self.cell) % self.n_cols
+
+    def add(self, lat, lon, payload):
+        self.cells.setdefault(self._cell(lat, lon), []).append((lat, lon, payload))
+        self.size += 1
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            return {(row, col)}
+        keys = set()
+        for dr in range(-r, r + 1):
+            step = 1 if abs(dr) == r else 2 * r
+            for dc in range(-r, r + 1, step):
+                keys.add((row + dr, (col + dc) % self.n_cols))
+        return keys
+
+    def _ring_min_km(self, lat, r):
+        # Anything outside the searched block is at least r whole cells away in lat or lon
+        edge_lat = min(90.0, abs(lat) + (r + 1) * self.cell)
+        return r * self.cell * KM_PER_DEG * math.cos(math.radians(edge_lat))
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        """
+        Return up to k (distance_km, payload) pairs ordered by distance.
+        """
+        if not self.size:
+            return []
+        row, col = self._cell(lat, lon)
+        found = []
+        seen = set()
+        examined = 0
+        for r in range(max(self.n_rows, self.n_cols)):
+            for key in self._ring(row, col, r) - seen:
+                seen.add(key)
+                bucket = self.cells.get(key, ())
+                examined += len(bucket)
+                for p_lat, p_lon, payload in bucket:
+                    d = haversine_km(lat, lon, p_lat, p_lon)
+                    if max_km is None or d <= max_km:
+                        found.append((d, payload))
+            ring_min = self._ring_min_km(lat, r)
+            if max_km is not None and ring_min > max_km:
+                break
+            if len(found) >= k and nsmallest(k, found, key=lambda x: x[0])[-1][0] <= ring_min:
+                break
+            if examined == self.size:
+                break
+        return nsmallest(k, found, key=lambda x: x[0])
+
+    def within_radius(self, lat, lon, radius_km):
+        """
+        Return every (distance_km, payload) pair within radius_km, nearest first.
+        """
+        dlat = radius_km / KM_PER_DEG
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+        dlon = min(180.0, radius_km / (KM_PER_DEG * max(cos_lat, 1e-6)))
+        row_lo, _ = self._cell(max(-90.0, lat - dlat), lon)
+        row_hi, _ = self._cell(min(90.0, lat + dlat), lon)
+        n_span = min(self.n_cols, int(2 * dlon // self.cell) + 2)
+        _, col_lo = self._cell(lat, lon - dlon)
+
+        found = []
+        for row in range(row_lo, row_hi + 1):
+            for i in range(n_span):
+                for p_lat, p_lon, payload in self.cells.get((row, (col_lo + i) % self.n_cols), ()):
+                    d = haversine_km(lat, lon, p_lat, p_lon)
+                    if d <= radius_km:
+                        found.append((d, payload))
+        found.sort(key=lambda x: x[0])
+        return found
@@ -0,0 +1,33 @@
+"""
+The NumPy RouteGeometry.interval_points must place stops exactly where the
+pure-Python fallback in openrouteservice_api does.
+
+    python -m pytest test_interval_coords.py
+"""
+import numpy as np
+import pytest
+
+from openrouteservice_api import _interval_coords_scalar
+from route_geometry import RouteGeometry
+
+
+def _random_polyline(rng, n):
+    # A wandering route around NYC with 5-decimal precision like decoded polylines,
+    # including some repeated vertices (zero-length segments)
+    steps = rng.normal(0, 0.01, size=(n, 2))
+    steps[rng.random(n) < 0.05] = 0
+    coords = np.round(np.array([40.7, -74.0]) + np.cumsum(steps, axis=0), 5)
+    return [tuple(p) for p in coords.tolist()]
+
+
+@pytest.mark.parametrize("interpolate", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_interval_points_match_scalar(seed, interpolate):
+    rng = np.random.default_rng(seed)
+    coords = _random_polyline(rng, int(rng.integers(2, 500)))
+    geometry = RouteGeometry(coords)
+    for num_intervals in range(11):
+        expected = _interval_coords_scalar(coords, num_intervals, interpolate)
+        actual = geometry.interval_points(num_intervals, interpolate)
+        assert len(actual) == len(expected), num_intervals
+        np.testing.assert_allclose(np.reshape(actual, (-1, 2)), np.reshape(expected, (-1, 2)), rtol=0, atol=1e-9)
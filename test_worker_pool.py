@@ -0,0 +1,62 @@
+"""
+Trips planned on the worker pool must still show up in the submitting
+process's metrics (the admin panel reads tracing, http_client and
+trip_cache there). The workers talk to the benchmark stub server in
+synthesize mode, so no API keys or network are needed.
+
+    python -m pytest test_worker_pool.py
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import http_client  # noqa: E402
+import stub_server  # noqa: E402
+import tracing  # noqa: E402
+import trip_cache  # noqa: E402
+import worker_pool  # noqa: E402
+
+STUBBED_HOSTS = ["nominatim.openstreetmap.org", "api.open-meteo.com", "api.opencagedata.com", "overpass-api.de"]
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    server, base_url = stub_server.start(fixtures_dir=str(tmp_path / "fixtures"), synthesize=True)
+    # Read by the spawned workers when they import the app modules
+    monkeypatch.setenv("ORS_BASE_URL", f"{base_url}/api.openrouteservice.org")
+    monkeypatch.setenv("ORS_API_KEY", "fixture")
+    monkeypatch.setenv("HTTP_HOST_OVERRIDES", ",".join(f"{host}={base_url}/{host}" for host in STUBBED_HOSTS))
+    monkeypatch.setenv("ROUTE_CACHE_BYPASS", "1")
+    monkeypatch.setenv("HOT_PAIRS_REFRESH_INTERVAL", "0")
+    monkeypatch.chdir(tmp_path)  # app_data.db and the other relative paths land here
+    monkeypatch.setattr(worker_pool, "WORKERS", 2)
+    worker_pool.init_job_store()
+    yield
+    if worker_pool._pool is not None:
+        worker_pool._pool.shutdown(wait=True, cancel_futures=True)
+        worker_pool._pool = None
+    server.shutdown()
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_worker_metrics_reach_the_submitting_process(pool):
+    misses = trip_cache.stats["misses"]
+    job_id = worker_pool.submit_trip((40.7580, -73.9855), (41.0534, -73.5387), ["tolls"], 25, num_intervals=2)
+    events = list(worker_pool.stream(job_id, timeout=60))
+
+    assert any(stage == "route" for stage, _, _ in events), events
+    # Metrics are merged by the future's done callback, which may run just after the last event
+    assert _wait_for(lambda: "trip_pipeline.run_trip" in tracing.snapshot())
+    assert any(name.startswith("ors.") for name in tracing.snapshot())
+    assert "api.open-meteo.com/v1/forecast" in http_client.latency_snapshot()
+    assert trip_cache.stats["misses"] > misses
@@ -0,0 +1,160 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+WINDOW_SIZE = 1000  # recent durations kept per span name for percentiles
+RECENT_REQUESTS = 20
+
+_current = contextvars.ContextVar("trace", default=None)
+_lock = threading.Lock()
+_windows = {}  # span name -> deque of recent durations (seconds)
+_totals = {}  # span name -> [count, sum_seconds, errors] since process start
+_recent = deque(maxlen=RECENT_REQUESTS)
+
+
+def begin_request(name="rerun"):
+    """
+    Start collecting spans for the current request (one Streamlit script run).
+    """
+    trace = {"id": uuid.uuid4().hex[:12], "name": name, "started": time.time(), "spans": []}
+    _current.set(trace)
+    return trace
+
+
+def end_request():
+    trace = _current.get()
+    if trace is None:
+        return None
+    trace["duration"] = time.time() - trace["started"]
+    _current.set(None)
+    with _lock:
+        _recent.append(trace)
+    return trace
+
+
+def _aggregate(name, seconds, error):
+    with _lock:
+        window = _windows.get(name)
+        if window is None:
+            window = _windows[name] = deque(maxlen=WINDOW_SIZE)
+            _totals[name] = [0, 0.0, 0]
+        window.append(seconds)
+        totals = _totals[name]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += error
+
+
+def _record(name, seconds, error):
+    _aggregate(name, seconds, error)
+    trace = _current.get()
+    if trace is not None:
+        trace["spans"].append({"name": name, "seconds": round(seconds, 4), "error": bool(error)})
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except GeneratorExit:
+        raise  # a generator closed early by its consumer has not failed
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _record(name, time.perf_counter() - start, error)
+
+
+def propagate(func):
+    """
+    Wrap func to run in a copy of the caller's context, so spans recorded
+    on thread pool workers still land in the current request's trace.
+    Each call gets its own copy, so the wrapper can run on several threads
+    at once.
+    """
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def traced(name):
+    """
+    Decorator recording each call of the wrapped function as a span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def merge(trace):
+    """
+    Add a request trace finished in another process (e.g. a worker_pool
+    job) to this process's rolling stats and recent requests.
+    """
+    for sp in trace["spans"]:
+        _aggregate(sp["name"], sp["seconds"], sp["error"])
+    with _lock:
+        _recent.append(trace)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def snapshot():
+    """
+    {span name: {"count", "errors", "sum", "p50", "p95", "p99", "max"}};
+    percentiles cover the last WINDOW_SIZE calls, counts the process lifetime.
+    """
+    with _lock:
+        windows = {name: sorted(values) for name, values in _windows.items()}
+        totals = {name: list(t) for name, t in _totals.items()}
+    return {
+        name: {
+            "count": totals[name][0],
+            "errors": totals[name][2],
+            "sum": totals[name][1],
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "max": values[-1] if values else None,
+        }
+        for name, values in windows.items()
+    }
+
+
+def recent_requests():
+    with _lock:
+        return list(_recent)
+
+
+def to_json():
+    return json.dumps({"spans": snapshot(), "recent_requests": recent_requests()}, indent=2)
+
+
+def to_prometheus(prefix="transportnyc_span_seconds"):
+    lines = [f"# HELP {prefix} Duration of traced external calls and heavy local steps.", f"# TYPE {prefix} summary"]
+    for name, stats in sorted(snapshot().items()):
+        for q, quantile in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+            if stats[q] is not None:
+                lines.append(f'{prefix}{{span="{name}",quantile="{quantile}"}} {stats[q]:.6f}')
+        lines.append(f'{prefix}_sum{{span="{name}"}} {stats["sum"]:.6f}')
+        lines.append(f'{prefix}_count{{span="{name}"}} {stats["count"]}')
+        lines.append(f'{prefix}_errors_total{{span="{name}"}} {stats["errors"]}')
+    return "\n".join(lines) + "\n"
@@ -1,23 +1,39 @@
 import streamlit as st
 import os
-import json
 from datetime import datetime
 import hashlib
-import requests
-import folium
-from streamlit_folium import st_folium
-import polyline as pl
-import time
-from PIL import Image
 import base64
 from io import BytesIO
-from openrouteservice_api import get_driving_route, get_interval_coords, search_nearby_pois
+import geocoding
+from trip_pipeline import run_trip
+import trip_cache
+import router_ai
+import hot_pairs
+import worker_pool
+from route_geometry import RouteGeometry
 from db import init_db, create_user, get_user, increment_count
+from chat_store import init_chat_store, append_message, recent_visible
+import http_client
+import tracing
 
-init_db()
+tracing.begin_request()
 
-def get_image_base64(image_path):
+@st.cache_resource
+def init_process():
+    # Schema setup and table loads run once per server process, not on every rerun
+    init_db()
+    init_chat_store()
+    worker_pool.init_job_store()
+    hot_pairs.get_table()
+
+init_process()
+
+@st.cache_data
+def get_image_base64(image_path, width, mtime):
+    # Encoded once per file version; downscaled to twice the display width instead of shipping the full image
+    from PIL import Image
     img = Image.open(image_path)
+    img.thumbnail((width * 2, width * 2))
     buffered = BytesIO()
     img.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode()
@@ -25,7 +41,7 @@ def get_image_base64(image_path):
 # Logo
 logo_path = "router-logo.png"
 if os.path.exists(logo_path):
-    logo_base64 = get_image_base64(logo_path)
+    logo_base64 = get_image_base64(logo_path, 170, os.path.getmtime(logo_path))
     st.markdown(
         f"""
         <div style="text-align: center; margin-bottom: -1.2rem;">
@@ -37,18 +53,6 @@ if os.path.exists(logo_path):
 else:
     st.warning("Logo could not load. Continue scrolling though to use the app!")
 
-# Chat history (still using JSON)
-CHAT_FILE = "chat.json"
-def load_json(filename, default):
-    if os.path.exists(filename):
-        with open(filename, "r") as f:
-            return json.load(f)
-    return default
-def save_json(filename, obj):
-    with open(filename, "w") as f:
-        json.dump(obj, f, indent=2)
-chat_log = load_json(CHAT_FILE, [])
-
 # Layout
 st.set_page_config(page_title="TransportNYC", layout="centered")
 main_col, ai_col = st.columns([3, 1])
@@ -98,70 +102,53 @@ if "username" in st.session_state:
                 parts = message.strip().split(" ", 1)
                 if len(parts) > 1:
                     private_to = parts[0][1:]
-            chat_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "sender": st.session_state.username,
-                "recipient": private_to,
-                "message": message.strip()
-            }
-            chat_log.append(chat_entry)
-            save_json(CHAT_FILE, chat_log)
+            append_message(st.session_state.username, message.strip(), recipient=private_to)
             increment_count(st.session_state.username, "chat_count")
 
         st.write("### 📜 Recent Messages:")
-        for c in reversed(chat_log[-20:]):
-            if not c.get("message") or not c.get("sender"):
-                continue
-            is_global = c.get("recipient") is None
-            is_private_to_me = c.get("recipient") == st.session_state.username
-            is_sent_by_me = c.get("sender") == st.session_state.username
-            if is_global or is_private_to_me or is_sent_by_me:
-                ts_fmt = "Unknown"
-                try:
-                    ts_fmt = datetime.fromisoformat(c.get("timestamp", "")).strftime("%Y-%m-%d %H:%M")
-                except:
-                    pass
-                prefix = "🔒 " if c.get("recipient") else ""
-                st.write(f"`{ts_fmt}` {prefix}**{c['sender']}**: {c['message']}")
+        for c in recent_visible(st.session_state.username, limit=20):
+            ts_fmt = "Unknown"
+            try:
+                ts_fmt = datetime.fromisoformat(c.get("timestamp", "")).strftime("%Y-%m-%d %H:%M")
+            except:
+                pass
+            prefix = "🔒 " if c.get("recipient") else ""
+            st.write(f"`{ts_fmt}` {prefix}**{c['sender']}**: {c['message']}")
 
 # Main Route Form
 with main_col:
     st.title("🚦 Router")
     st.subheader("Optimize your routes for cost, gas, and time")
 
-    GAS_PRICE = 3.140
+    MODE_VARIANTS = {"Drive (with tolls)": "tolls", "Drive (no tolls)": "no_tolls"}
+    MAP_LABELS = {"tolls": "With Tolls", "no_tolls": "No Tolls"}
     LOCATIONIQ_KEY = st.secrets["LOCATIONIQ_KEY"]
-    OPENCAGE_KEY = st.secrets["OPENCAGE_KEY"]
 
-    def estimate_gas_cost(miles, mpg):
-        return round((miles / mpg) * GAS_PRICE, 2)
-
-    def get_place_suggestions(query):
-        try:
-            time.sleep(0.5)
-            res = requests.get("https://api.opencagedata.com/geocode/v1/json", params={
-                "q": query,
-                "key": OPENCAGE_KEY,
-                "limit": 5,
-                "no_annotations": 1
-            })
-            res.raise_for_status()
-            results = res.json().get("results", [])
-            return [{"label": i["formatted"], "value": (i["geometry"]["lat"], i["geometry"]["lng"])} for i in results]
-        except Exception as e:
-            st.error(f"Geocoding failed: {e}")
-            return []
+    @tracing.traced("opencage.get_place_suggestions")
+    def get_place_suggestions(queries):
+        suggestions = []
+        for outcome in geocoding.suggest_many(queries):
+            if isinstance(outcome, Exception):
+                st.error(f"Geocoding failed: {outcome}")
+                suggestions.append([])
+            else:
+                suggestions.append(outcome)
+        return suggestions
 
     def extract_highways_from_steps(steps):
         return list({step.get("instruction", "") for step in steps if any(k in step.get("instruction", "") for k in ["I-", "US-", "Route", "Hwy", "Highway", "Turnpike", "Freeway", "Parkway"])})[:6]
 
-    def show_map_with_route(start_coords, end_coords, polyline_str, steps, label, color="blue"):
+    @tracing.traced("show_map_with_route")
+    def show_map_with_route(start_coords, end_coords, polyline_str, highways, label, color="blue"):
+        import folium  # deferred: only needed once there is a route to draw
+        geometry = RouteGeometry.from_polyline(polyline_str)
         m = folium.Map()
-        m.fit_bounds([start_coords, end_coords])
+        if geometry.bbox is not None:
+            m.fit_bounds(geometry.bbox)
         folium.Marker(start_coords, tooltip="Start", icon=folium.Icon(color="green")).add_to(m)
         folium.Marker(end_coords, tooltip="End", icon=folium.Icon(color="red")).add_to(m)
-        folium.PolyLine(pl.decode(polyline_str), color=color, weight=5, opacity=0.7).add_to(m)
-        highways = extract_highways_from_steps(steps)
+        if len(geometry):
+            folium.PolyLine(geometry.for_map(), color=color, weight=5, opacity=0.7).add_to(m)
         if highways:
             folium.Marker(
                 location=start_coords,
@@ -169,7 +156,7 @@ with main_col:
             ).add_to(m)
         return m
 
-    for key in ["origin_coords", "dest_coords", "run_triggered", "tolled_route", "nontolled_route", "results"]:
+    for key in ["origin_coords", "dest_coords", "run_triggered", "trip", "trip_maps"]:
         if key not in st.session_state:
             st.session_state[key] = None if key != "run_triggered" else False
 
@@ -187,97 +174,172 @@ with main_col:
         num_intervals = st.number_input("How many breaks do you want to take during the trip?", min_value=0, max_value=10, step=1)
 
         origin_coords, dest_coords = None, None
+        lookups = [q for q in (origin_query, destination_query) if q and len(q) >= 3]
+        found = dict(zip(lookups, get_place_suggestions(lookups))) if lookups else {}
         if origin_query and len(origin_query) >= 3:
-            origin_opts = get_place_suggestions(origin_query)
+            origin_opts = found[origin_query]
             if origin_opts:
                 selected_origin = st.selectbox("Select Start", origin_opts, format_func=lambda x: x["label"], key="origin_select")
                 origin_coords = selected_origin["value"]
         if destination_query and len(destination_query) >= 3:
-            dest_opts = get_place_suggestions(destination_query)
+            dest_opts = found[destination_query]
             if dest_opts:
                 selected_dest = st.selectbox("Select Destination", dest_opts, format_func=lambda x: x["label"], key="dest_select")
                 dest_coords = selected_dest["value"]
 
         submit = st.form_submit_button("Find Routes")
 
+    def render_route_summary(mode, route):
+        st.markdown(f"### 🚀 {mode}")
+        if route.get("snapped_to"):
+            st.caption(f"⚡ Precomputed route for {route['snapped_to']}")
+        st.write(f"**Time:** {round(route['duration_mins'] / 60, 1)} hours\n**Distance:** {route['distance_miles']:.2f} miles\n**Gas Cost:** ${route['gas_cost']:.2f}\n**Traffic:** `{route['traffic_color'].upper()}`")
+        if route.get("alternatives"):
+            st.caption("Alternatives: " + "; ".join(f"{a['duration_mins'] / 60:.1f} hours, {a['distance_miles']:.1f} miles" for a in route["alternatives"]))
+
+    def route_highways(trip, variant, route):
+        return trip_cache.get_or_build(
+            trip["key"], ("highways", variant), lambda: extract_highways_from_steps(route["steps"]), trip_cache.digest(route["polyline"])
+        )
+
+    def render_route_map(trip, mode, variant, route):
+        st.markdown(f"#### {mode}")
+        # Maps are memoized per session rather than in trip_cache: st_folium renders
+        # into the map's figure, so one Map object must not be shared across sessions.
+        maps = st.session_state.trip_maps
+        if maps is None or maps["key"] != trip["key"]:
+            maps = st.session_state.trip_maps = {"key": trip["key"]}
+        map_key = (variant, trip_cache.digest(route["polyline"]))
+        if map_key not in maps:
+            maps[map_key] = show_map_with_route(trip["origin"], trip["dest"], route["polyline"], route_highways(trip, variant, route), MAP_LABELS[variant], route["traffic_color"])
+        from streamlit_folium import st_folium
+        st_folium(maps[map_key], width=700, height=400)
+
+    def render_stops(stops):
+        st.markdown("### 🛑 Suggested Stops Along the Route")
+        if any(stop.get("degraded") for stop in stops):
+            st.caption("Corridor search is unavailable right now; these are nearby results and may be incomplete.")
+        for i, stop in enumerate(stops):
+            gas, food, hotel = stop["pois"]["gas"], stop["pois"]["food"], stop["pois"]["hotel"]
+            st.markdown(f"#### Stop {i+1} near ({round(stop['lat'], 3)}, {round(stop['lon'], 3)})")
+            if gas: st.markdown(f"- ⛽ Gas: **{gas[0]['display_name']}**")
+            if food: st.markdown(f"- 🍴 Food: **{food[0]['display_name']}**")
+            if hotel: st.markdown(f"- 🛏 Hotel: **{hotel[0]['display_name']}**")
+            st.markdown("---")
+
+    def render_weather(points):
+        temps = [p["temp_c"] for p in points if p.get("temp_c") is not None]
+        st.markdown("### 🌤 Weather Along the Route")
+        if not temps:
+            st.write("No forecast available for this route.")
+            return
+        st.write(f"Expected temperatures: **{min(temps):.0f}–{max(temps):.0f}°C** at the times you pass through")
+        with st.expander("Forecast by point"):
+            st.dataframe([{"lat": round(p["lat"], 3), "lon": round(p["lon"], 3), "temp_c": p.get("temp_c"), "time": p.get("timestamp")} for p in points])
+
+    trip_events = None
     if submit and origin_coords and dest_coords:
         st.session_state.origin_coords = origin_coords
         st.session_state.dest_coords = dest_coords
         st.session_state.run_triggered = True
+        variants = [v for mode, v in MODE_VARIANTS.items() if mode in transport_modes]
+        st.session_state.trip = {
+            "key": trip_cache.trip_key(origin_coords, dest_coords, variants, num_intervals),
+            "origin": origin_coords, "dest": dest_coords, "variants": variants, "num_intervals": num_intervals,
+            "routes": {}, "stops": None, "weather": None, "errors": []
+        }
+        if worker_pool.WORKERS > 0:
+            trip_events = worker_pool.stream(worker_pool.submit_trip(origin_coords, dest_coords, variants, mpg_val, num_intervals))
+        else:
+            trip_events = run_trip(origin_coords, dest_coords, variants, mpg_val, num_intervals)
 
-        results = []
-        with st.spinner("Fetching route data..."):
-            if "Drive (with tolls)" in transport_modes:
-                route = get_driving_route(origin_coords, dest_coords, avoid_tolls=False)
-                if route:
-                    results.append(("Drive (with tolls)", route["duration_mins"], route["distance_miles"], estimate_gas_cost(route["distance_miles"], mpg_val), route["traffic_color"]))
-                    st.session_state.tolled_route = route
-            if "Drive (no tolls)" in transport_modes:
-                route = get_driving_route(origin_coords, dest_coords, avoid_tolls=True)
-                if route:
-                    results.append(("Drive (no tolls)", route["duration_mins"], route["distance_miles"], estimate_gas_cost(route["distance_miles"], mpg_val), route["traffic_color"]))
-                    st.session_state.nontolled_route = route
-        st.session_state.results = results
-        st.session_state.num_intervals = num_intervals
-
-    if st.session_state.run_triggered and st.session_state.results:
-        for mode, time_min, dist, cost, color in st.session_state.results:
-            st.markdown(f"### 🚀 {mode}")
-            st.write(f"**Time:** {round(time_min / 60, 1)} hours\n**Distance:** {dist:.2f} miles\n**Gas Cost:** ${cost:.2f}\n**Traffic:** `{color.upper()}`")
+    trip = st.session_state.trip
+    if st.session_state.run_triggered and trip and trip["variants"]:
+        # Placeholders in final layout order, filled as each pipeline stage finishes
+        modes = {v: mode for mode, v in MODE_VARIANTS.items() if v in trip["variants"]}
+        error_slot = st.empty()
+        summary_slots = {v: st.empty() for v in modes}
         st.markdown("### 🗺 Route Maps")
-        cols = st.columns(2 if st.session_state.tolled_route and st.session_state.nontolled_route else 1)
-        if st.session_state.tolled_route:
-            with cols[0]:
-                st.markdown("#### Drive (with tolls)")
-                m1 = show_map_with_route(st.session_state.origin_coords, st.session_state.dest_coords, st.session_state.tolled_route["polyline"], st.session_state.tolled_route["steps"], "With Tolls", st.session_state.tolled_route["traffic_color"])
-                st_folium(m1, width=700, height=400)
-        if st.session_state.nontolled_route:
-            with cols[1 if st.session_state.tolled_route else 0]:
-                st.markdown("#### Drive (no tolls)")
-                m2 = show_map_with_route(st.session_state.origin_coords, st.session_state.dest_coords, st.session_state.nontolled_route["polyline"], st.session_state.nontolled_route["steps"], "No Tolls", st.session_state.nontolled_route["traffic_color"])
-                st_folium(m2, width=700, height=400)
-        if st.session_state.num_intervals > 0:
-            route_used = st.session_state.nontolled_route or st.session_state.tolled_route
-            interval_coords = get_interval_coords(route_used["polyline"], st.session_state.num_intervals)
-            st.markdown("### 🛑 Suggested Stops Along the Route")
-            for i, (lat, lon) in enumerate(interval_coords):
-                gas = search_nearby_pois(lat, lon, "gas")
-                food = search_nearby_pois(lat, lon, "food")
-                hotel = search_nearby_pois(lat, lon, "hotel")
-                st.markdown(f"#### Stop {i+1} near ({round(lat, 3)}, {round(lon, 3)})")
-                if gas: st.markdown(f"- ⛽ Gas: **{gas[0]['display_name']}**")
-                if food: st.markdown(f"- 🍴 Food: **{food[0]['display_name']}**")
-                if hotel: st.markdown(f"- 🛏 Hotel: **{hotel[0]['display_name']}**")
-                st.markdown("---")
+        map_slots = {v: col.empty() for v, col in zip(modes, st.columns(len(modes)))}
+        stops_slot = st.empty()
+        weather_slot = st.empty()
+
+        def fill(stage, variant=None):
+            if stage == "route":
+                with summary_slots[variant].container():
+                    render_route_summary(modes[variant], trip["routes"][variant])
+                with map_slots[variant].container():
+                    render_route_map(trip, modes[variant], variant, trip["routes"][variant])
+            elif stage == "stops":
+                with stops_slot.container():
+                    render_stops(trip["stops"])
+            elif stage == "weather":
+                with weather_slot.container():
+                    render_weather(trip["weather"])
+            elif stage == "error":
+                with error_slot.container():
+                    for message in trip["errors"]:
+                        st.error(message)
+
+        if trip_events is not None:
+            for slot in summary_slots.values():
+                slot.info("Fetching route...")
+            if trip["num_intervals"] > 0:
+                stops_slot.info("Finding stops along the route...")
+            weather_slot.info("Checking the weather along the route...")
+            for stage, key, payload in trip_events:
+                if stage == "route":
+                    trip["routes"][key] = payload
+                elif stage == "error":
+                    trip["errors"].append(payload)
+                else:
+                    trip[stage] = payload
+                fill(stage, key)
+            for v in modes:
+                if v not in trip["routes"]:
+                    summary_slots[v].empty()
+                    map_slots[v].empty()
+            if trip["stops"] is None:
+                stops_slot.empty()
+            if trip["weather"] is None:
+                weather_slot.empty()
+        else:
+            fill("error")
+            for v in trip["routes"]:
+                fill("route", v)
+            if trip["stops"] is not None:
+                fill("stops")
+            if trip["weather"] is not None:
+                fill("weather")
 
 # AI Column
 with ai_col:
     st.markdown("## 🤖 RouterAI")
-    import openai
-    openai.api_key = st.secrets["OPENAI_API_KEY"]
-
-    def ask_hustlerai(question, context=None):
-        system = "You are RouterAI, a friendly and knowledgeable transportation assistant, especially on specific routes and the weather/traffic conditions along them and what food, gas, and lodging options there are. You also know what routes are scenic and not...."
-        if context:
-            system += f" Context: {context}"
-        try:
-            resp = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "system", "content": system}, {"role": "user", "content": question}],
-                max_tokens=500,
-                temperature=0.25
-            )
-            return resp.choices[0].message.content.strip()
-        except Exception as e:
-            return f"Error from RouterAI: {e}"
-
     if st.session_state.get("username"):
         context = f"Origin: {st.session_state.origin_coords}, Destination: {st.session_state.dest_coords}" if st.session_state.get("origin_coords") and st.session_state.get("dest_coords") else ""
         ai_question = st.text_area("Ask RouterAI about your trip!", key="hustlerai_input_area")
         if st.button("Ask RouterAI", key="hustlerai_btn") and ai_question.strip():
-            with st.spinner("RouterAI is thinking..."):
-                ai_reply = ask_hustlerai(ai_question, context)
-                st.success(f"**RouterAI:** {ai_reply}")
-                increment_count(st.session_state.username, "ai_count")
+            st.markdown("**RouterAI:**")
+            st.write_stream(router_ai.ask_stream(ai_question, context))
+            increment_count(st.session_state.username, "ai_count")
     else:
         st.info("Login to use RouterAI")
+
+# Admin timing panel
+trace = tracing.end_request()
+if st.session_state.get("username") in st.secrets.get("ADMIN_USERS", []):
+    with st.sidebar.expander("⏱ Timing"):
+        st.write(f"This run: {trace['duration'] * 1000:.0f} ms")
+        st.dataframe([{"span": sp["name"], "ms": round(sp["seconds"] * 1000, 1), "error": sp["error"]} for sp in trace["spans"]])
+        st.write("Rolling percentiles (ms)")
+        st.dataframe([
+            {"span": name, "count": v["count"], "errors": v["errors"],
+             **{q: round(v[q] * 1000, 1) for q in ("p50", "p95", "p99")}}
+            for name, v in sorted(tracing.snapshot().items())
+        ])
+        st.download_button("Download JSON", tracing.to_json(), file_name="timings.json")
+        st.download_button("Download Prometheus", tracing.to_prometheus() + http_client.prometheus_histograms(), file_name="timings.prom")
+        st.write(f"Trip cache: {trip_cache.stats['hits']} hits, {trip_cache.stats['misses']} misses")
+        if st.button("Clear trip cache"):
+            worker_pool.invalidate_trip_cache()
+            st.session_state.trip_maps = None
@@ -0,0 +1,68 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import route_cache
+
+CACHE_TTL = 3600  # seconds
+CACHE_MAX_ENTRIES = 256
+
+# (trip key, artifact name, discriminator) -> (built_at, value); shared by every session.
+# Artifacts are built from the trip's routes and never mutated afterwards.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+def trip_key(origin, dest, variants=(), num_intervals=0):
+    """
+    Identify a trip by what its derived artifacts depend on. Coordinates are
+    quantized like route_cache keys so a reselected suggestion still hits.
+    """
+    return (route_cache.quantize(origin), route_cache.quantize(dest), tuple(sorted(variants)), int(num_intervals))
+
+
+def digest(text):
+    """
+    Short stable fingerprint of a route polyline, so artifacts built from an
+    older route for the same trip are never served after the route changes.
+    """
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def get_or_build(key, name, build, discriminator=None, cacheable=None):
+    """
+    The cached artifact, or build() stored for CACHE_TTL. A value for which
+    cacheable(value) is false is returned without being stored, e.g. one
+    built from a failed lookup.
+    """
+    full_key = (key, name, discriminator)
+    with _cache_lock:
+        entry = _cache.get(full_key)
+        if entry is not None and time.time() - entry[0] <= CACHE_TTL:
+            _cache.move_to_end(full_key)
+            stats["hits"] += 1
+            return entry[1]
+        stats["misses"] += 1
+    value = build()
+    if cacheable is not None and not cacheable(value):
+        return value
+    with _cache_lock:
+        _cache[full_key] = (time.time(), value)
+        _cache.move_to_end(full_key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def invalidate(key=None):
+    """
+    Drop every artifact of one trip, or of all trips when key is None.
+    Returns the number of entries removed.
+    """
+    with _cache_lock:
+        doomed = [k for k in _cache if key is None or k[0] == key]
+        for k in doomed:
+            del _cache[k]
+    return len(doomed)
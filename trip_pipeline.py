@@ -0,0 +1,159 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from openrouteservice_api import get_interval_coords, get_route_variants, search_nearby_pois_batch
+from poi_corridor import search_corridor_pois
+import hot_pairs
+import tracing
+import trip_cache
+import weather_agent
+
+GAS_PRICE = 3.140
+STOP_KINDS = ["gas", "food", "hotel"]
+WEATHER_POINTS = 12  # route points sampled for the weather stage
+ROUTE_ALTERNATIVES = int(os.getenv("ROUTE_ALTERNATIVES", 1))  # extra ORS candidates per variant; 0 for the best route only
+
+
+def estimate_gas_cost(miles, mpg):
+    # Accepts scalars or NumPy arrays (e.g. a get_duration_matrix distance matrix)
+    cost = np.round(np.asarray(miles, dtype=float) / mpg * GAS_PRICE, 2)
+    return float(cost) if cost.ndim == 0 else cost
+
+
+def preferred_variant(variants):
+    """
+    The variant stops and weather are planned along: no tolls when requested.
+    """
+    return "no_tolls" if "no_tolls" in variants else variants[0]
+
+
+def _plan_stops(polyline_str, num_intervals):
+    """
+    Stops with POIs from the corridor search. When that fails they come
+    from the per-stop Nominatim fallback instead, which turns its own
+    failures into empty lists, so those stops are marked "degraded".
+    """
+    coords = get_interval_coords(polyline_str, num_intervals)
+    try:
+        pois, degraded = search_corridor_pois(polyline_str, coords, STOP_KINDS), False
+    except Exception:
+        pois, degraded = search_nearby_pois_batch(coords, STOP_KINDS), True
+    stops = [{"lat": lat, "lon": lon, "pois": p} for (lat, lon), p in zip(coords, pois)]
+    if degraded:
+        for stop in stops:
+            stop["degraded"] = True
+    return stops
+
+
+def _is_degraded(stops):
+    return any(stop.get("degraded") for stop in stops)
+
+
+def plan_stops(key, polyline_str, num_intervals):
+    """
+    Stops along a route, memoized per trip key and route in trip_cache.
+    Degraded stops are not memoized, so the next run retries the corridor search.
+    """
+    return trip_cache.get_or_build(
+        key, "stops", lambda: _plan_stops(polyline_str, num_intervals), trip_cache.digest(polyline_str),
+        cacheable=lambda stops: not _is_degraded(stops)
+    )
+
+
+def _weather(route):
+    coords = weather_agent.extract_route_coords(route["polyline"])
+    coords = coords[::max(1, len(coords) // WEATHER_POINTS)]
+    arrivals = weather_agent.estimate_arrival_times(coords, route["duration_mins"])
+    return weather_agent.get_weather_for_coords(coords, arrivals)
+
+
+def run_trip(origin_coords, dest_coords, variants, mpg, num_intervals=0, weather=True):
+    """
+    Plan a trip as a stream of (stage, key, payload) events, yielded as soon
+    as each piece is ready:
+
+        ("route", variant, route)     route dict plus "gas_cost" and "alternatives", one per variant
+        ("stops", variant, stops)     [{"lat", "lon", "pois": {kind: [...]}}, ...]
+        ("weather", variant, points)  get_weather_for_coords output
+        ("error", stage, message)     a stage failed; the others carry on
+
+    Variants are routed concurrently, each through its own
+    get_route_variants call so a variant's best candidate streams out as
+    soon as it is routed; the other candidates ride along as "alternatives"
+    summaries (duration_mins, distance_miles, score relative to the best).
+    Stops and weather start as soon as the preferred variant's route
+    arrives rather than after every route. Trips that snap onto a hot pair
+    (see hot_pairs.py) are answered from the precomputed table; such routes
+    carry "snapped_to".
+    """
+    variants = list(variants)
+    if not variants:
+        return
+    # Spans the iteration, not the call: calling a generator function only creates it
+    with tracing.span("trip_pipeline.run_trip"):
+        yield from _run_trip(origin_coords, dest_coords, variants, mpg, num_intervals, weather)
+
+
+def _run_trip(origin_coords, dest_coords, variants, mpg, num_intervals, weather):
+    preferred = preferred_variant(variants)
+    key = trip_cache.trip_key(origin_coords, dest_coords, variants, num_intervals)
+    hot = hot_pairs.lookup(origin_coords, dest_coords)
+    routes = {}
+
+    def fetch_route(variant):
+        if hot and variant in hot["routes"]:
+            return dict(hot["routes"][variant], snapped_to=f"{hot['origin']} → {hot['destination']}")
+        candidates = get_route_variants(origin_coords, dest_coords, (variant,), ROUTE_ALTERNATIVES)
+        if not candidates:
+            return None
+        best, *others = candidates
+        route = {k: v for k, v in best.items() if k != "geometry"}  # events stay JSON-serializable for worker_pool
+        route["alternatives"] = [{k: c[k] for k in ("duration_mins", "distance_miles", "score")} for c in others]
+        return route
+
+    with ThreadPoolExecutor(max_workers=len(variants) + 2) as pool:
+        def submit(func, *args):
+            return pool.submit(tracing.propagate(func), *args)
+
+        pending = {submit(fetch_route, v): ("route", v) for v in variants}
+
+        def plan_along(variant):
+            route = routes[variant]
+            if num_intervals > 0:
+                precomputed = route.get("snapped_to") and hot["stops"].get(variant, {}).get(str(num_intervals))
+                if precomputed is not None:
+                    pending[submit(lambda: precomputed)] = ("stops", variant)
+                else:
+                    pending[submit(plan_stops, key, route["polyline"], num_intervals)] = ("stops", variant)
+            if weather:
+                pending[submit(_weather, route)] = ("weather", variant)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, variant = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result, error = None, f"{variant}: {e}"
+                else:
+                    error = f"No {variant.replace('_', ' ')} route found" if result is None else None
+                if stage != "route":
+                    yield ("error", stage, error) if error else (stage, variant, result)
+                    continue
+                if error:
+                    yield "error", stage, error
+                    if variant == preferred:
+                        # Plan along whichever other route arrives (or has arrived) instead
+                        preferred = next(iter(routes), None)
+                        if preferred:
+                            plan_along(preferred)
+                    continue
+                routes[variant] = dict(result, gas_cost=estimate_gas_cost(result["distance_miles"], mpg))
+                yield "route", variant, routes[variant]
+                if preferred is None:
+                    preferred = variant
+                if variant == preferred:
+                    plan_along(variant)
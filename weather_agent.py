@@ -1,44 +1,108 @@
-import requests
-from polyline import decode
+import http_client
+import tracing
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from route_geometry import RouteGeometry
+from spatial_index import haversine_km
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+GRID_DEG = 0.1  # forecast cells are shared by every point within ~10km
+FORECAST_TTL = 30 * 60  # seconds
+BATCH_SIZE = 50  # locations per Open-Meteo request
+
+_forecast_cache = {}  # (cell_lat, cell_lon) -> (fetched_at, {hour: temp_c})
+_cache_lock = threading.Lock()
 
 def extract_route_coords(polyline_str, interval=15):
     """
     Extract every nth coordinate from polyline for weather lookup.
     """
-    coords = decode(polyline_str)
-    return coords[::interval]
+    return [tuple(p) for p in RouteGeometry.from_polyline(polyline_str).points[::interval].tolist()]
+
+def estimate_arrival_times(coords, duration_mins, depart_at=None):
+    """
+    Estimate when the trip reaches each coordinate, assuming constant speed along the route.
+    """
+    depart_at = depart_at or datetime.now(timezone.utc)
+    dists = [0.0]
+    for a, b in zip(coords, coords[1:]):
+        dists.append(dists[-1] + haversine_km(a[0], a[1], b[0], b[1]))
+    total = dists[-1] or 1.0
+    return [depart_at + timedelta(minutes=duration_mins * d / total) for d in dists]
+
+def _cell(lat, lon):
+    return round(round(lat / GRID_DEG) * GRID_DEG, 4), round(round(lon / GRID_DEG) * GRID_DEG, 4)
+
+def _hour_key(when):
+    return when.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:00")
+
+def _fetch_forecasts(cells):
+    """
+    Fetch hourly temperatures for many grid cells in one Open-Meteo request.
+    """
+    res = http_client.get(FORECAST_URL, params={
+        "latitude": ",".join(str(lat) for lat, _ in cells),
+        "longitude": ",".join(str(lon) for _, lon in cells),
+        "hourly": "temperature_2m",
+        "timezone": "GMT"
+    })
+    res.raise_for_status()
+    data = res.json()
+    if isinstance(data, dict):  # single-location responses are not wrapped in a list
+        data = [data]
+    now = time.time()
+    with _cache_lock:
+        for cell, entry in zip(cells, data):
+            hourly = entry.get("hourly", {})
+            _forecast_cache[cell] = (now, dict(zip(hourly.get("time", []), hourly.get("temperature_2m", []))))
+
+def _purge_expired():
+    cutoff = time.time() - FORECAST_TTL
+    with _cache_lock:
+        for cell in [c for c, (fetched_at, _) in _forecast_cache.items() if fetched_at < cutoff]:
+            del _forecast_cache[cell]
 
-def get_weather_for_coords(coords):
+@tracing.traced("open_meteo.get_weather_for_coords")
+def get_weather_for_coords(coords, arrival_times=None):
     """
     Fetch hourly temperature data from Open-Meteo for selected route points.
+    Points are snapped to forecast grid cells, uncached cells are fetched in
+    batches, and each point reports the temperature for the hour the trip
+    gets there (arrival_times, defaulting to now).
     """
-    weather_data = []
-    for lat, lon in coords:
+    arrival_times = arrival_times or [datetime.now(timezone.utc)] * len(coords)
+    _purge_expired()
+    cells = [_cell(lat, lon) for lat, lon in coords]
+    with _cache_lock:
+        missing = list(dict.fromkeys(c for c in cells if c not in _forecast_cache))
+
+    errors = {}
+    for i in range(0, len(missing), BATCH_SIZE):
+        batch = missing[i:i + BATCH_SIZE]
         try:
-            res = requests.get("https://api.open-meteo.com/v1/forecast", params={
-                "latitude": lat,
-                "longitude": lon,
-                "hourly": "temperature_2m",
-                "timezone": "auto"
-            })
-            res.raise_for_status()
-            data = res.json()
-            hourly_temps = data.get("hourly", {}).get("temperature_2m", [])
-            hours = data.get("hourly", {}).get("time", [])
-            temp = hourly_temps[0] if hourly_temps else None
-            timestamp = hours[0] if hours else "Unknown"
-            weather_data.append({
-                "lat": lat,
-                "lon": lon,
-                "temp_c": temp,
-                "timestamp": timestamp
-            })
+            _fetch_forecasts(batch)
         except Exception as e:
+            errors.update((cell, str(e)) for cell in batch)
+
+    weather_data = []
+    with _cache_lock:
+        forecasts = {c: _forecast_cache.get(c) for c in set(cells)}
+    for (lat, lon), cell, arrival in zip(coords, cells, arrival_times):
+        if cell in errors or forecasts[cell] is None:
             weather_data.append({
                 "lat": lat,
                 "lon": lon,
-                "error": str(e)
+                "error": errors.get(cell, "No forecast available")
             })
+            continue
+        hour = _hour_key(arrival)
+        weather_data.append({
+            "lat": lat,
+            "lon": lon,
+            "temp_c": forecasts[cell][1].get(hour),
+            "timestamp": f"{hour} UTC"
+        })
     return weather_data
 
 def show_weather_along_route(coords, weather_info):
@@ -0,0 +1,283 @@
+"""
+Process pool that runs trip jobs outside the Streamlit script thread.
+
+submit_trip() queues a run_trip job on a local process pool (one worker
+per core by default) and returns a job id derived from the trip, so every
+session asking for the same trip shares one job. Workers write each
+pipeline event to the trip_job_events table in app_data.db; stream()
+replays a job's events from there as they arrive, so any session (or any
+replica on the same disk) can follow a job it did not submit.
+
+Each external provider gets a semaphore shared by all workers, and the
+per-host rate limits are divided between them, so adding workers adds
+CPU, not upstream load.
+
+Each job returns its trace, request latencies and trip_cache counters,
+which are merged into the submitting process, so tracing.snapshot(),
+http_client.latency_snapshot() and trip_cache.stats cover worker jobs.
+"""
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from db import get_connection as _conn
+
+WORKERS = int(os.getenv("TRIP_WORKERS", os.cpu_count() or 1))  # 0 runs trips in the script thread
+JOB_TTL = 10 * 60  # seconds a finished job's events are reused for identical trips; older jobs are purged
+STALE_AFTER = 120  # seconds without progress before a queued/running job is resubmitted
+POLL_INTERVAL = 0.1  # seconds between event polls
+
+# Concurrent requests allowed per provider across all workers
+PROVIDER_LIMITS = {
+    "api.openrouteservice.org": 4,
+    "overpass-api.de": 2,
+    "nominatim.openstreetmap.org": 1,
+    "api.open-meteo.com": 4,
+    "api.opencagedata.com": 1,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_submit_lock = threading.Lock()
+_cache_generation = 0  # bumped by invalidate_trip_cache(); workers clear their trip_cache when it changes
+_worker_cache_generation = 0  # in a worker: the generation its trip_cache was last cleared for
+
+
+def init_job_store():
+    conn = _conn()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trip_jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trip_job_events (
+            job_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            key TEXT,
+            payload TEXT,
+            PRIMARY KEY (job_id, seq)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS trip_jobs_updated_at ON trip_jobs (updated_at)")
+    conn.commit()
+
+
+def job_id_for(origin_coords, dest_coords, variants, mpg, num_intervals):
+    import trip_cache
+    raw = json.dumps([trip_cache.trip_key(origin_coords, dest_coords, variants, num_intervals), float(mpg)])
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _init_worker(semaphores, workers):
+    import hot_pairs
+    import http_client
+    import rate_limit
+    hot_pairs.REFRESH_INTERVAL = 0  # the app process rebuilds the table; workers reload it by mtime
+    for host, semaphore in semaphores.items():
+        http_client.limit_concurrency(host, semaphore)
+    rate_limit.scale(1 / workers)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the Streamlit process is heavily multithreaded
+            ctx = multiprocessing.get_context("spawn")
+            semaphores = {host: ctx.BoundedSemaphore(n) for host, n in PROVIDER_LIMITS.items()}
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=ctx, initializer=_init_worker, initargs=(semaphores, WORKERS)
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _set_status(conn, job_id, status):
+    conn.execute("UPDATE trip_jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id))
+    conn.commit()
+
+
+def _run_job(job_id, origin_coords, dest_coords, variants, mpg, num_intervals, cache_generation=0):
+    """
+    Run one trip job in a worker. Returns the job's metrics for _merge_metrics.
+    """
+    global _worker_cache_generation
+    import http_client
+    import tracing
+    import trip_cache
+
+    if cache_generation != _worker_cache_generation:
+        trip_cache.invalidate()
+        _worker_cache_generation = cache_generation
+    latency, cache_stats = http_client.latency_snapshot(), dict(trip_cache.stats)
+    tracing.begin_request("trip_job")
+    try:
+        _run_trip_job(job_id, origin_coords, dest_coords, variants, mpg, num_intervals)
+    finally:
+        trace = tracing.end_request()
+    return {
+        "trace": trace,
+        "latency": http_client.latency_since(latency),
+        "trip_cache": {k: v - cache_stats.get(k, 0) for k, v in trip_cache.stats.items()},
+    }
+
+
+def _run_trip_job(job_id, origin_coords, dest_coords, variants, mpg, num_intervals):
+    from trip_pipeline import run_trip
+
+    conn = _conn()
+    _set_status(conn, job_id, "running")
+    seq = 0
+
+    def emit(stage, key, payload):
+        nonlocal seq
+        seq += 1
+        conn.execute(
+            "INSERT INTO trip_job_events (job_id, seq, stage, key, payload) VALUES (?, ?, ?, ?, ?)",
+            (job_id, seq, stage, key, json.dumps(payload))
+        )
+        conn.execute("UPDATE trip_jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+        conn.commit()
+
+    try:
+        for stage, key, payload in run_trip(origin_coords, dest_coords, variants, mpg, num_intervals):
+            emit(stage, key, payload)
+    except Exception as e:
+        emit("error", "job", f"Trip planning failed: {e}")
+        _set_status(conn, job_id, "failed")
+        return
+    _set_status(conn, job_id, "done")
+
+
+def _merge_metrics(metrics):
+    import http_client
+    import tracing
+    import trip_cache
+
+    tracing.merge(metrics["trace"])
+    http_client.merge_latency(metrics["latency"])
+    for k, v in metrics["trip_cache"].items():
+        trip_cache.stats[k] = trip_cache.stats.get(k, 0) + v
+
+
+def _job_finished(job_id, future):
+    """
+    Merge a finished job's metrics, and record jobs that died with their
+    worker so followers stop waiting.
+    """
+    global _pool
+    error = future.exception()
+    if error is None:
+        _merge_metrics(future.result())
+        return
+    if isinstance(error, BrokenProcessPool):
+        with _pool_lock:
+            _pool = None  # start a fresh pool on the next submit
+    conn = _conn()
+    seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM trip_job_events WHERE job_id = ?", (job_id,)).fetchone()[0]
+    conn.execute(
+        "INSERT INTO trip_job_events (job_id, seq, stage, key, payload) VALUES (?, ?, 'error', 'job', ?)",
+        (job_id, seq + 1, json.dumps(f"Trip planning failed: {error}"))
+    )
+    _set_status(conn, job_id, "failed")
+
+
+def _purge_expired(conn):
+    """
+    Delete jobs, and their events, that have not changed for JOB_TTL: past
+    reuse if finished, and long given up on by stream() if not.
+    """
+    cutoff = time.time() - JOB_TTL
+    conn.execute("DELETE FROM trip_job_events WHERE job_id IN (SELECT job_id FROM trip_jobs WHERE updated_at < ?)", (cutoff,))
+    conn.execute("DELETE FROM trip_jobs WHERE updated_at < ?", (cutoff,))
+
+
+def submit_trip(origin_coords, dest_coords, variants, mpg, num_intervals=0):
+    """
+    Queue a trip job, or join the identical one already queued, running or
+    recently finished. Returns the job id to pass to stream().
+    """
+    job_id = job_id_for(origin_coords, dest_coords, variants, mpg, num_intervals)
+    conn = _conn()
+    with _submit_lock:
+        conn.execute("BEGIN IMMEDIATE")  # claim the job across processes too
+        try:
+            _purge_expired(conn)
+            row = conn.execute("SELECT status, updated_at FROM trip_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            age = time.time() - row[1] if row else None
+            if row and ((row[0] == "done" and age < JOB_TTL) or (row[0] in ("queued", "running") and age < STALE_AFTER)):
+                conn.commit()
+                return job_id
+            conn.execute("DELETE FROM trip_job_events WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO trip_jobs (job_id, status, updated_at) VALUES (?, 'queued', ?)", (job_id, time.time())
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()  # don't leave this thread's connection holding the write lock
+            raise
+    future = _get_pool().submit(
+        _run_job, job_id, tuple(origin_coords), tuple(dest_coords), list(variants), mpg, num_intervals, _cache_generation
+    )
+    future.add_done_callback(lambda f: _job_finished(job_id, f))
+    return job_id
+
+
+def invalidate_trip_cache():
+    """
+    Clear trip_cache here and, as they pick up their next job, in every
+    worker; finished jobs are dropped too so identical trips are replanned.
+    Returns the number of entries removed in this process.
+    """
+    global _cache_generation
+    import trip_cache
+
+    _cache_generation += 1
+    conn = _conn()
+    conn.execute("DELETE FROM trip_job_events WHERE job_id IN (SELECT job_id FROM trip_jobs WHERE status = 'done')")
+    conn.execute("DELETE FROM trip_jobs WHERE status = 'done'")
+    conn.commit()
+    return trip_cache.invalidate()
+
+
+def poll(job_id, after=0):
+    """
+    ([(seq, stage, key, payload), ...] newer than after, job status).
+    """
+    conn = _conn()
+    # Status first: a finished status then guarantees every event is already visible
+    status = conn.execute("SELECT status FROM trip_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    rows = conn.execute(
+        "SELECT seq, stage, key, payload FROM trip_job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+    ).fetchall()
+    return [(seq, stage, key, json.loads(payload)) for seq, stage, key, payload in rows], status[0] if status else None
+
+
+def stream(job_id, timeout=120):
+    """
+    Yield a job's (stage, key, payload) events as the worker records them,
+    like trip_pipeline.run_trip does in-process.
+    """
+    after, deadline = 0, time.monotonic() + timeout
+    while True:
+        events, status = poll(job_id, after)
+        for seq, stage, key, payload in events:
+            after = seq
+            yield stage, key, payload
+        if status in ("done", "failed", None) and not events:
+            return
+        if time.monotonic() > deadline:
+            yield "error", "job", "Timed out waiting for trip results"
+            return
+        if not events:
+            time.sleep(POLL_INTERVAL)